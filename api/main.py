@@ -12,14 +12,22 @@ sys.path.insert(0, str(project_root))
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import uvicorn
 import asyncio
+import orjson
+import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from src.rag_pipeline import RAGPipeline
+from src.llm import aclose_shared_clients
+from src.memory import format_timestamp
+from src.preprocess import make_preview
 from src.logging_utils import setup_logging, get_logger
 from src.error_handling import ChatbotError
 from config.settings import settings
@@ -28,13 +36,33 @@ from config.settings import settings
 setup_logging()
 logger = get_logger(__name__)
 
+# Upload directory, resolved and created once at import
+DATA_DIR = settings.data_directory
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZip middleware that leaves selected (streaming) paths uncompressed."""
+    
+    def __init__(self, app, exclude_paths: tuple = (), **kwargs):
+        super().__init__(app, **kwargs)
+        self.exclude_paths = set(exclude_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Chatbot API",
     description="Production-grade Document Q&A System with RAG",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -46,9 +74,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses; token streams must not be buffered by the compressor
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    exclude_paths=("/query/stream",),
+    minimum_size=1024,
+    compresslevel=5
+)
+
 # Global pipeline instance
 pipeline: Optional[RAGPipeline] = None
 
+# WebSocket chunk coalescing thresholds
+WS_FLUSH_CHARS = 256
+WS_FLUSH_INTERVAL = 0.03  # seconds
+
 
 # Request/Response Models
 class QueryRequest(BaseModel):
@@ -83,7 +123,14 @@ async def startup_event():
     global pipeline
     try:
         logger.info("Starting RAG Chatbot API...")
+        # Larger default pool for the blocking pipeline calls run via asyncio.to_thread
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=min(64, (os.cpu_count() or 1) * 4))
+        )
         pipeline = RAGPipeline()
+        if settings.embed_warmup:
+            # Warm up in the background so startup and health checks are not delayed
+            asyncio.get_running_loop().run_in_executor(None, pipeline.embedding_manager.warmup)
         logger.info("RAG Pipeline initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize pipeline: {str(e)}")
@@ -94,6 +141,7 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down RAG Chatbot API...")
+    await aclose_shared_clients()
 
 
 # Health Check Endpoint
@@ -119,29 +167,35 @@ async def upload_documents(files: List[UploadFile] = File(...)):
     try:
         logger.info(f"Received {len(files)} files for upload")
         
-        # Save uploaded files temporarily
-        temp_paths = []
-        settings.data_directory.mkdir(exist_ok=True)
-        
-        for file in files:
-            temp_path = settings.data_directory / file.filename
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            temp_paths.append(str(temp_path))
-        
-        # Ingest documents
-        pipeline.ingest_documents(temp_paths)
+        if settings.persist_uploads:
+            # Save uploaded files to the data directory, then ingest from disk
+            temp_paths = []
+            
+            for file in files:
+                temp_path = DATA_DIR.joinpath(file.filename)
+                with open(temp_path, "wb") as buffer:
+                    shutil.copyfileobj(file.file, buffer, length=1 << 20)
+                temp_paths.append(str(temp_path))
+            
+            await pipeline.aingest_documents(temp_paths)
+        else:
+            # Parse the uploaded streams directly, no extra disk round-trip
+            await asyncio.to_thread(
+                pipeline.ingest_streams,
+                [(file.filename, file.file) for file in files]
+            )
         
         # Get chunk count (approximate)
-        chunk_count = len(temp_paths) * 10  # Rough estimate
+        chunk_count = len(files) * 10  # Rough estimate
         
         logger.info(f"Successfully processed {len(files)} documents")
         
-        return DocumentUploadResponse(
-            message="Documents processed successfully",
-            files_processed=len(files),
-            chunks_created=chunk_count
-        )
+        # Return the payload directly; response_model is kept for the OpenAPI schema
+        return ORJSONResponse(content={
+            "message": "Documents processed successfully",
+            "files_processed": len(files),
+            "chunks_created": chunk_count
+        })
         
     except Exception as e:
         logger.error(f"Error uploading documents: {str(e)}")
@@ -152,7 +206,7 @@ async def upload_documents(files: List[UploadFile] = File(...)):
 async def clear_documents():
     """Clear all documents from the knowledge base"""
     try:
-        pipeline.clear_knowledge_base()
+        await asyncio.to_thread(pipeline.clear_knowledge_base)
         return {"message": "Knowledge base cleared successfully"}
     except Exception as e:
         logger.error(f"Error clearing knowledge base: {str(e)}")
@@ -168,13 +222,15 @@ async def query_documents(request: QueryRequest):
     try:
         logger.info(f"Processing query: {request.question[:100]}...")
         
-        response = pipeline.ask_question(
+        # Async pipeline: embedding/retrieval run in threads, the LLM call is awaited
+        response = await pipeline.aask_question(
             question=request.question,
             conversation_id=request.conversation_id,
             top_k=request.top_k
         )
         
-        return QueryResponse(**response)
+        # The pipeline already returns the QueryResponse shape; skip re-validation
+        return ORJSONResponse(content=response)
         
     except ChatbotError as e:
         logger.error(f"Chatbot error: {str(e)}")
@@ -194,16 +250,22 @@ async def query_documents_stream(request: QueryRequest):
         
         async def generate_stream():
             try:
-                # Get relevant documents
-                relevant_docs = pipeline.embedding_manager.search_similar(
-                    request.question, 
+                # Embed the question once and retrieve with the vector
+                query_embedding = await asyncio.to_thread(
+                    pipeline.embedding_manager.embed_query,
+                    request.question
+                )
+                relevant_docs = await asyncio.to_thread(
+                    pipeline.embedding_manager.search_by_vector,
+                    query_embedding,
                     request.top_k
                 )
                 
                 # Get conversation history
                 conversation_history = None
                 if request.conversation_id:
-                    conversation_history = pipeline.memory.get_conversation_history(
+                    conversation_history = await asyncio.to_thread(
+                        pipeline.memory.get_conversation_history,
                         request.conversation_id
                     )
                 
@@ -219,10 +281,12 @@ async def query_documents_stream(request: QueryRequest):
                 
                 # Store conversation turn after streaming
                 if request.conversation_id:
-                    pipeline.memory.add_conversation_turn(
+                    await asyncio.to_thread(
+                        pipeline.memory.add_conversation_turn,
                         conversation_id=request.conversation_id,
                         user_message=request.question,
-                        assistant_message=full_answer
+                        assistant_message=full_answer,
+                        query_embedding=query_embedding.tobytes()
                     )
                     
             except Exception as e:
@@ -237,13 +301,19 @@ async def query_documents_stream(request: QueryRequest):
 
 
 # WebSocket Endpoint for Real-time Chat
+async def send_ws_json(websocket: WebSocket, payload: Dict[str, Any]) -> None:
+    """Serialize a payload with orjson and send it as a text frame."""
+    # Text frames keep browser clients' JSON.parse(event.data) working
+    await websocket.send_text(orjson.dumps(payload).decode("utf-8"))
+
+
 @app.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
     """
     WebSocket endpoint for real-time chat
     """
     await websocket.accept()
-    conversation_id = pipeline.memory.create_conversation()
+    conversation_id = await asyncio.to_thread(pipeline.memory.create_conversation)
     
     try:
         logger.info(f"WebSocket connection established. Conversation ID: {conversation_id}")
@@ -254,20 +324,32 @@ async def websocket_chat(websocket: WebSocket):
             question = data.get("question", "")
             
             if not question:
-                await websocket.send_json({"error": "Empty question"})
+                await send_ws_json(websocket, {"error": "Empty question"})
                 continue
             
             logger.info(f"WebSocket query: {question[:100]}...")
             
-            # Get relevant documents
-            relevant_docs = pipeline.embedding_manager.search_similar(question, top_k=5)
+            # Embed the question once and retrieve with the vector
+            query_embedding = await asyncio.to_thread(
+                pipeline.embedding_manager.embed_query, question
+            )
+            relevant_docs = await asyncio.to_thread(
+                pipeline.embedding_manager.search_by_vector, query_embedding, top_k=5
+            )
             
             # Get conversation history
-            conversation_history = pipeline.memory.get_conversation_history(conversation_id)
+            conversation_history = await asyncio.to_thread(
+                pipeline.memory.get_conversation_history, conversation_id
+            )
             
             # Stream response
             full_answer = ""
-            await websocket.send_json({"type": "start"})
+            await send_ws_json(websocket, {"type": "start"})
+            
+            # Coalesce token chunks into fewer frames (flush by size or age)
+            buffer = []
+            buffered_chars = 0
+            last_flush = time.monotonic()
             
             async for chunk in pipeline.llm.generate_response_stream(
                 query=question,
@@ -275,30 +357,45 @@ async def websocket_chat(websocket: WebSocket):
                 conversation_history=conversation_history
             ):
                 full_answer += chunk
-                await websocket.send_json({
+                buffer.append(chunk)
+                buffered_chars += len(chunk)
+                now = time.monotonic()
+                if buffered_chars >= WS_FLUSH_CHARS or now - last_flush >= WS_FLUSH_INTERVAL:
+                    await send_ws_json(websocket, {
+                        "type": "chunk",
+                        "content": "".join(buffer)
+                    })
+                    buffer.clear()
+                    buffered_chars = 0
+                    last_flush = now
+            
+            if buffer:
+                await send_ws_json(websocket, {
                     "type": "chunk",
-                    "content": chunk
+                    "content": "".join(buffer)
                 })
             
             # Send sources
             sources = [
                 {
                     "source": doc['metadata'].get('source_document', 'Unknown'),
-                    "content_preview": doc['content'][:200]
+                    "content_preview": doc['metadata'].get('preview') or make_preview(doc['content'])
                 }
                 for doc in relevant_docs
             ]
             
-            await websocket.send_json({
+            await send_ws_json(websocket, {
                 "type": "end",
                 "sources": sources
             })
             
             # Store conversation
-            pipeline.memory.add_conversation_turn(
+            await asyncio.to_thread(
+                pipeline.memory.add_conversation_turn,
                 conversation_id=conversation_id,
                 user_message=question,
-                assistant_message=full_answer
+                assistant_message=full_answer,
+                query_embedding=query_embedding.tobytes()
             )
             
     except WebSocketDisconnect:
@@ -306,7 +403,7 @@ async def websocket_chat(websocket: WebSocket):
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
         try:
-            await websocket.send_json({"error": str(e)})
+            await send_ws_json(websocket, {"error": str(e)})
         except:
             pass
 
@@ -315,7 +412,7 @@ async def websocket_chat(websocket: WebSocket):
 @app.post("/conversations/new")
 async def create_conversation():
     """Create a new conversation"""
-    conversation_id = pipeline.memory.create_conversation()
+    conversation_id = await asyncio.to_thread(pipeline.memory.create_conversation)
     return {"conversation_id": conversation_id}
 
 
@@ -323,7 +420,9 @@ async def create_conversation():
 async def get_conversation_history(conversation_id: str):
     """Get conversation history"""
     try:
-        history = pipeline.memory.get_conversation_history(conversation_id)
+        history = await asyncio.to_thread(pipeline.memory.get_conversation_history, conversation_id)
+        # Keep the ISO 'timestamp' field clients already read
+        history = [{**turn, 'timestamp': format_timestamp(turn['timestamp_ns'])} for turn in history]
         return {"conversation_id": conversation_id, "history": history}
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Conversation not found: {str(e)}")
@@ -344,19 +443,33 @@ async def get_analytics():
 
 # Main entry point
 if __name__ == "__main__":
-    import os
-    
     # Production settings for deployment
     is_production = os.getenv("RENDER") or os.getenv("RAILWAY_ENVIRONMENT")
     
     logger.info(f"Starting server on {settings.api_host}:{settings.api_port}")
     logger.info(f"Production mode: {bool(is_production)}")
     
+    # Prefer uvloop + httptools when available (uvicorn[standard])
+    server_options = {}
+    try:
+        import uvloop  # noqa: F401
+        server_options["loop"] = "uvloop"
+    except ImportError:
+        logger.info("uvloop not installed, using default asyncio loop")
+    try:
+        import httptools  # noqa: F401
+        server_options["http"] = "httptools"
+    except ImportError:
+        logger.info("httptools not installed, using default HTTP parser")
+    
+    # Reload needs an import string so the reloader can re-import the app
     uvicorn.run(
-        app,  # Pass app object directly for production
+        app if is_production else "api.main:app",
+        app_dir=str(project_root),
         host=settings.api_host,
         port=settings.api_port,
         reload=False if is_production else True,
         workers=1,
-        log_level="info"
+        log_level="info",
+        **server_options
     )
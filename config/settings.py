@@ -18,14 +18,37 @@ class Settings:
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
         self.llm_model = os.getenv("LLM_MODEL", "amazon/nova-2-lite")
         self.llm_fallback_model = os.getenv("LLM_FALLBACK_MODEL", "meta-llama/llama-3.2-3b-instruct:free")
+        # Run embeddings through an int8-quantized ONNX Runtime model (needs optimum[onnxruntime])
+        self.use_onnx_embed = os.getenv("USE_ONNX_EMBED", "false").lower() in ("1", "true")
+        # Load and warm up the embedding model in the background on API startup
+        self.embed_warmup = os.getenv("EMBED_WARMUP", "true").lower() in ("1", "true")
+        # Fire a 1-token completion with the RAG system prompt while retrieval runs, so the
+        # connection and provider prefix cache are warm (billed; at most once per interval)
+        self.llm_prewarm = os.getenv("LLM_PREWARM", "false").lower() in ("1", "true")
+        self.llm_prewarm_interval = float(os.getenv("LLM_PREWARM_INTERVAL", "30"))
         
         # Text Processing
         self.chunk_size = int(os.getenv("CHUNK_SIZE", "1000"))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "200"))
+        # "character" (default) or "token" (tiktoken; sizes above are then in tokens)
+        self.text_splitter = os.getenv("TEXT_SPLITTER", "character").lower()
         
         # Database
         self.database_url = os.getenv("DATABASE_URL", "sqlite:///./database/chatbot.db")
         self.chroma_persist_directory = os.getenv("CHROMA_PERSIST_DIRECTORY", "./database/chroma_db")
+        # Drop the vector collection on startup (needed after switching embedding models)
+        self.reset_on_start = os.getenv("RESET_ON_START", "false").lower() == "true"
+        # Serve similarity search from a FAISS HNSW index (needs faiss-cpu)
+        self.use_faiss = os.getenv("USE_FAISS", "false").lower() == "true"
+        
+        # Caching
+        self.embedding_cache_enabled = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+        self.query_embedding_cache_size = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "256"))
+        self.query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "512"))
+        self.query_cache_tolerance = float(os.getenv("QUERY_CACHE_TOLERANCE", "0.05"))
+        self.semantic_cache_size = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+        self.semantic_cache_threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        self.semantic_cache_ttl = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
         
         # Redis Configuration
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -36,6 +59,8 @@ class Settings:
         # Render uses PORT, fallback to API_PORT for local development
         self.api_port = int(os.getenv("PORT", os.getenv("API_PORT", "8000")))
         self.api_workers = int(os.getenv("API_WORKERS", "4"))
+        # Keep a copy of uploaded files in the data directory
+        self.persist_uploads = os.getenv("PERSIST_UPLOADS", "false").lower() == "true"
         
         # Feature Flags
         self.enable_hybrid_search = os.getenv("ENABLE_HYBRID_SEARCH", "true").lower() == "true"
@@ -43,6 +68,17 @@ class Settings:
         self.enable_streaming = os.getenv("ENABLE_STREAMING", "true").lower() == "true"
         self.enable_analytics = os.getenv("ENABLE_ANALYTICS", "true").lower() == "true"
         
+        # Streaming: number of token deltas per yielded chunk grows from min to max
+        self.stream_min_batch_size = int(os.getenv("STREAM_MIN_BATCH_SIZE", "1"))
+        self.stream_max_batch_size = int(os.getenv("STREAM_MAX_BATCH_SIZE", "32"))
+        self.stream_batch_timeout = float(os.getenv("STREAM_BATCH_TIMEOUT", "0.05"))  # seconds
+        
+        # Conversation memory: turns kept per conversation (0 = unlimited)
+        self.max_history = int(os.getenv("MAX_HISTORY", "1000"))
+        # "sqlite" (durable, shared across workers) or "memory"
+        self.conversation_store = os.getenv("CONVERSATION_STORE", "sqlite").lower()
+        self.conversation_db_path = os.getenv("CONVERSATION_DB_PATH", "./database/conversations.db")
+        
         # Logging
         self.log_level = os.getenv("LOG_LEVEL", "INFO")
         self.log_file = os.getenv("LOG_FILE", "./logs/app.log")
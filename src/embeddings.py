@@ -1,20 +1,41 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
+import asyncio
+import hashlib
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer
 from config.settings import settings
 from src.logging_utils import get_logger
 from src.error_handling import EmbeddingError
+from src.faiss_index import FaissIndex
 
 logger = get_logger(__name__)
 
+# Rebuild the FAISS index once dead rows exceed this fraction of live rows, since
+# every search over-fetches by the number of dead rows
+FAISS_COMPACT_RATIO = 0.25
+
+# sentence-transformers truncates at the model's max_seq_length, which is shorter
+# than the tokenizer's limit (256 vs 512 for all-MiniLM-L6-v2)
+DEFAULT_MAX_SEQ_LENGTH = 256
+
 class EmbeddingManager:
     """Manages document embeddings and vector storage using local models."""
     
     def __init__(self):
         # Lazy loading for cloud deployment (save memory on startup)
         self.embedding_model = None
+        self.onnx_model = None
+        self.tokenizer = None
+        self.max_seq_length = DEFAULT_MAX_SEQ_LENGTH
         self._model_loaded = False
+        self._model_lock = threading.Lock()
         logger.info(f"EmbeddingManager initialized (lazy loading enabled)")
         
         # Initialize ChromaDB
@@ -23,31 +44,290 @@ class EmbeddingManager:
             settings=ChromaSettings(anonymized_telemetry=False)
         )
         
-        # Delete old collection if it exists (to fix dimension mismatch)
-        try:
-            self.chroma_client.delete_collection(name="documents")
-            logger.info("Deleted old documents collection")
-        except:
-            pass
+        # Optionally drop the old collection (e.g. after changing embedding dimensions)
+        if settings.reset_on_start:
+            try:
+                self.chroma_client.delete_collection(name="documents")
+                logger.info("Deleted old documents collection")
+            except Exception:
+                pass
         
-        # Create fresh collection
-        self.collection = self.chroma_client.create_collection(
+        # Reuse the persisted collection and its index across restarts
+        self.collection = self.chroma_client.get_or_create_collection(
             name="documents",
             metadata={"description": "Document embeddings for RAG chatbot"}
         )
+        
+        # Persistent embedding cache keyed by sha256(model + text). WAL lets the
+        # per-thread read connections look up vectors while a write is in progress.
+        self._cache_path = str(settings.cache_directory / "embeddings.sqlite")
+        self._cache_conn = None
+        self._cache_lock = threading.Lock()
+        self._cache_local = threading.local()
+        if settings.embedding_cache_enabled:
+            self._cache_conn = sqlite3.connect(self._cache_path, check_same_thread=False)
+            self._cache_conn.execute("PRAGMA journal_mode=WAL")
+            self._cache_conn.execute("PRAGMA synchronous=NORMAL")
+            self._cache_conn.execute(
+                "CREATE TABLE IF NOT EXISTS emb (hash BLOB PRIMARY KEY, vec BLOB)"
+            )
+            self._cache_conn.commit()
+        
+        # Small LRU of recent query vectors; queries are not worth a row in
+        # the SQLite cache, but popular ones repeat within a process
+        self._query_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_vectors_capacity = settings.query_embedding_cache_size
+        self._query_vectors_lock = threading.Lock()
+        
+        # Approximate semantic query cache: ring buffer of normalized query
+        # embeddings and the retrieval results they produced
+        self._qcache_capacity = settings.query_cache_size
+        self._qcache_tolerance = settings.query_cache_tolerance
+        self._qcache_keys: Optional[np.ndarray] = None
+        self._qcache_vals: List[Optional[Tuple[int, List[Dict[str, Any]]]]] = []
+        self._qcache_count = 0
+        self._qcache_next = 0
+        # Bumped on every clear so searches that started earlier cannot repopulate it
+        self._qcache_generation = 0
+        self._qcache_lock = threading.Lock()
+        
+        # Optional FAISS index mirroring the collection for large corpora
+        self.faiss_index: Optional[FaissIndex] = None
+        if settings.use_faiss:
+            self.faiss_index = FaissIndex(settings.cache_directory / "faiss.index")
+            if settings.reset_on_start:
+                self.faiss_index.reset()
+            self._sync_faiss_index()
+    
+    def _sync_faiss_index(self) -> None:
+        """Load chunk payloads for the persisted FAISS index, rebuilding it if it is out of sync."""
+        stored_count = self.collection.count()
+        if self._faiss_needs_compaction():
+            logger.info(f"FAISS index has {self.faiss_index.dead_rows} dead rows, rebuilding")
+            self._materialize_faiss_index()
+            return
+        if len(self.faiss_index) == stored_count:
+            if stored_count == 0:
+                return
+            # Equal counts can still hide different chunks; every stored id must resolve
+            stored = self.collection.get(ids=self.faiss_index.live_ids(), include=["documents", "metadatas"])
+            if self.faiss_index.hydrate(stored['ids'], stored['documents'], stored['metadatas']) == stored_count:
+                return
+        logger.info(f"FAISS index has {len(self.faiss_index)} vectors but the collection has {stored_count}, rebuilding")
+        self._materialize_faiss_index()
+    
+    def _materialize_faiss_index(self) -> None:
+        """Build the FAISS index from the vectors already stored in ChromaDB."""
+        existing = self.collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = np.asarray(existing['embeddings'], dtype=np.float32)
+        if existing['ids']:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        self.faiss_index.rebuild(existing['ids'], existing['documents'], embeddings, existing['metadatas'])
+        self.faiss_index.save()
+        logger.info(f"Built FAISS index from {len(existing['ids'])} stored chunks")
+    
+    def _faiss_needs_compaction(self) -> bool:
+        """Whether dead FAISS rows have grown enough to slow down searches."""
+        dead_rows = self.faiss_index.dead_rows
+        return dead_rows > 0 and dead_rows > FAISS_COMPACT_RATIO * len(self.faiss_index)
+    
+    def persist_index(self) -> None:
+        """Write pending FAISS index changes to disk (call once per ingest), compacting if needed."""
+        if self.faiss_index is None:
+            return
+        if self._faiss_needs_compaction():
+            logger.info(f"FAISS index has {self.faiss_index.dead_rows} dead rows, rebuilding")
+            self._materialize_faiss_index()
+            return
+        self.faiss_index.save()
     
     def _load_model(self):
         """Lazy load the embedding model only when needed."""
-        if not self._model_loaded:
+        if self._model_loaded:
+            return
+        # Requests may arrive concurrently from the API thread pool
+        with self._model_lock:
+            if self._model_loaded:
+                return
+            if settings.use_onnx_embed:
+                self._load_onnx_model()
+                return
             logger.info(f"Loading embedding model: {settings.embedding_model}")
             model_name = settings.embedding_model.split('/')[-1]
             # Force CPU for cloud deployment
             import torch
             device = 'cpu'
+            torch.set_num_threads(os.cpu_count() or 1)
             self.embedding_model = SentenceTransformer(model_name, device=device)
             self._model_loaded = True
             logger.info(f"Embedding model loaded on {device}")
     
+    def warmup(self) -> None:
+        """Load the model and run a dummy batch so the first real query is not slow."""
+        try:
+            self._load_model()
+            self._encode(["warmup"] * 4)
+            logger.info("Embedding model warmed up")
+        except Exception as e:
+            logger.warning(f"Embedding warmup failed: {str(e)}")
+    
+    def _load_onnx_model(self):
+        """Load an int8-quantized ONNX Runtime export of the embedding model."""
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise EmbeddingError(
+                f"USE_ONNX_EMBED requires optimum[onnxruntime] to be installed: {str(e)}"
+            )
+        
+        logger.info(f"Loading ONNX int8 embedding model: {settings.embedding_model}")
+        save_dir = settings.cache_directory / "onnx" / settings.embedding_model.replace('/', '__')
+        quantized_file = "model_quantized.onnx"
+        
+        # Export and quantize once, then reuse the artifact on later starts
+        if not (save_dir / quantized_file).exists():
+            logger.info("Exporting and quantizing embedding model to ONNX (one-time)")
+            model = ORTModelForFeatureExtraction.from_pretrained(
+                settings.embedding_model,
+                export=True,
+                provider="CPUExecutionProvider"
+            )
+            quantizer = ORTQuantizer.from_pretrained(model)
+            quantizer.quantize(
+                save_dir=save_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            )
+        
+        self.onnx_model = ORTModelForFeatureExtraction.from_pretrained(
+            save_dir,
+            file_name=quantized_file,
+            provider="CPUExecutionProvider"
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(settings.embedding_model)
+        self.max_seq_length = self._read_max_seq_length()
+        self._model_loaded = True
+        logger.info("ONNX embedding model loaded on CPU")
+    
+    def _read_max_seq_length(self) -> int:
+        """Read max_seq_length from the model's sentence-transformers config so truncation matches."""
+        try:
+            from huggingface_hub import hf_hub_download
+            config_path = hf_hub_download(settings.embedding_model, "sentence_bert_config.json")
+            with open(config_path, 'r', encoding='utf-8') as file:
+                return int(json.load(file)['max_seq_length'])
+        except Exception as e:
+            logger.warning(f"Could not read max_seq_length, using {DEFAULT_MAX_SEQ_LENGTH}: {str(e)}")
+            return DEFAULT_MAX_SEQ_LENGTH
+    
+    def _encode_onnx(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Encode texts with the ONNX model using mean pooling and L2 normalization."""
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            hidden = self.onnx_model(**inputs).last_hidden_state
+            # Mean-pool token embeddings, ignoring padding
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled)
+        return np.vstack(outputs)
+    
+    def _cache_key(self, text: str) -> bytes:
+        """Hash a text together with the model name for the embedding cache."""
+        # Quantized vectors differ slightly, so they get their own keyspace
+        model_name = f"{settings.embedding_model}:onnx-int8" if settings.use_onnx_embed else f"{settings.embedding_model}:normalized"
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+    
+    def _cache_reader(self) -> sqlite3.Connection:
+        """Return this thread's read-only connection to the embedding cache."""
+        conn = getattr(self._cache_local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._cache_path)
+            self._cache_local.conn = conn
+        return conn
+    
+    def _cache_get(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Look up cached embeddings for the given keys."""
+        found = {}
+        conn = self._cache_reader()
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT hash, vec FROM emb WHERE hash IN ({placeholders})", batch
+            ).fetchall()
+            for key, vec in rows:
+                found[key] = np.frombuffer(vec, dtype=np.float32)
+        return found
+    
+    def _cache_put(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        """Store newly computed embeddings in the cache."""
+        with self._cache_lock:
+            self._cache_conn.executemany(
+                "INSERT OR IGNORE INTO emb (hash, vec) VALUES (?, ?)",
+                [(key, vec.tobytes()) for key, vec in zip(keys, vectors)]
+            )
+            self._cache_conn.commit()
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Run the embedding model over a batch of texts."""
+        # Load model on first use (lazy loading)
+        self._load_model()
+        if self.onnx_model is not None:
+            return self._encode_onnx(texts).astype(np.float32, copy=False)
+        # One batched forward pass instead of one call per text. Vectors are
+        # L2-normalized by the library, so ChromaDB's default squared-L2
+        # distance equals 2 - 2 * dot(a, b) and dot product equals cosine.
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+    
+    def create_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Create embeddings for a batch of texts, reusing cached vectors where possible.
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            2-D array of embeddings, one row per text
+        """
+        try:
+            if self._cache_conn is None:
+                return self._encode(texts)
+            
+            keys = [self._cache_key(text) for text in texts]
+            cached = self._cache_get(keys)
+            
+            # Only encode texts we have not seen before
+            miss_indices = [i for i, key in enumerate(keys) if key not in cached]
+            if miss_indices:
+                miss_keys = [keys[i] for i in miss_indices]
+                miss_vectors = self._encode([texts[i] for i in miss_indices])
+                self._cache_put(miss_keys, miss_vectors)
+                cached.update(zip(miss_keys, miss_vectors))
+                logger.debug(f"Embedding cache: {len(texts) - len(miss_indices)} hits, {len(miss_indices)} misses")
+            
+            # Stitch results back together in the original order
+            return np.vstack([cached[key] for key in keys])
+        except Exception as e:
+            logger.error(f"Error creating embeddings: {str(e)}")
+            raise EmbeddingError(f"Failed to create embeddings: {str(e)}")
+    
     def create_embedding(self, text: str) -> List[float]:
         """
         Create embedding for a text using local SentenceTransformer model.
@@ -58,15 +338,47 @@ class EmbeddingManager:
         Returns:
             Embedding vector
         """
+        return self.create_embeddings([text])[0].tolist()
+    
+    def _query_vector(self, query: str) -> np.ndarray:
+        """Embed a query text, serving repeated queries from the in-memory LRU."""
+        with self._query_vectors_lock:
+            vector = self._query_vectors.get(query)
+            if vector is not None:
+                self._query_vectors.move_to_end(query)
+                return vector
+        
         try:
-            # Load model on first use (lazy loading)
-            self._load_model()
-            # Use local model - completely free, no API calls!
-            embedding = self.embedding_model.encode(text, convert_to_tensor=False)
-            return embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding)
+            vector = self._encode([query])[0]
         except Exception as e:
-            logger.error(f"Error creating embedding: {str(e)}")
-            raise EmbeddingError(f"Failed to create embedding: {str(e)}")
+            logger.error(f"Error creating embeddings: {str(e)}")
+            raise EmbeddingError(f"Failed to create embeddings: {str(e)}")
+        # Shared between callers, so guard against in-place edits
+        vector.setflags(write=False)
+        
+        with self._query_vectors_lock:
+            self._query_vectors[query] = vector
+            self._query_vectors.move_to_end(query)
+            while len(self._query_vectors) > self._query_vectors_capacity:
+                self._query_vectors.popitem(last=False)
+        return vector
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a query once for reuse across caching and retrieval.
+        
+        Args:
+            query: Query text
+            
+        Returns:
+            L2-normalized float32 query embedding
+        """
+        query_embedding = self._query_vector(query)
+        return query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+    
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """Async variant of embed_query; encoding runs in a worker thread."""
+        return await asyncio.to_thread(self.embed_query, query)
     
     def add_documents(self, chunks: List[Dict[str, Any]]) -> None:
         """
@@ -75,41 +387,153 @@ class EmbeddingManager:
         Args:
             chunks: List of chunk dictionaries
         """
+        if not chunks:
+            return
+        
         try:
-            # Prepare data for ChromaDB
-            ids = []
-            documents = []
-            metadatas = []
-            embeddings = []
-            
-            for chunk in chunks:
-                # Create embedding
-                embedding = self.create_embedding(chunk['content'])
-                
-                ids.append(chunk['chunk_id'])
-                documents.append(chunk['content'])
-                embeddings.append(embedding)
-                metadatas.append({
+            # Skip chunks already stored with identical content
+            existing = self.collection.get(ids=[chunk['chunk_id'] for chunk in chunks], include=["metadatas"])
+            stored_hashes = {
+                chunk_id: (metadata or {}).get('content_hash')
+                for chunk_id, metadata in zip(existing['ids'], existing['metadatas'])
+            }
+            new_chunks = [
+                chunk for chunk in chunks
+                if chunk.get('content_hash') is None or stored_hashes.get(chunk['chunk_id']) != chunk['content_hash']
+            ]
+            if not new_chunks:
+                logger.info(f"All {len(chunks)} chunks already stored, skipping embedding")
+                return
+            if len(new_chunks) < len(chunks):
+                logger.info(f"Skipping {len(chunks) - len(new_chunks)} unchanged chunks")
+            chunks = new_chunks
+            
+            # Create all embeddings in one batch
+            documents = [chunk['content'] for chunk in chunks]
+            embeddings = self.create_embeddings(documents)
+            
+            # Prepare data for ChromaDB as parallel lists
+            ids = [chunk['chunk_id'] for chunk in chunks]
+            metadatas = [
+                {
                     'source_document': chunk['source_document'],
                     'source_path': chunk['source_path'],
                     'chunk_index': chunk['chunk_index'],
-                    'chunk_size': chunk['chunk_size']
-                })
+                    'chunk_size': len(chunk['content']),
+                    'preview': chunk.get('preview', ''),
+                    'content_hash': chunk.get('content_hash', '')
+                }
+                for chunk in chunks
+            ]
             
-            # Add to ChromaDB
-            self.collection.add(
+            # Upsert so re-ingested chunks with changed content replace the old ones
+            self.collection.upsert(
                 ids=ids,
                 documents=documents,
-                embeddings=embeddings,
+                embeddings=embeddings,  # contiguous float32 matrix, no per-float boxing
                 metadatas=metadatas
             )
             
+            if self.faiss_index is not None:
+                self.faiss_index.add(ids, documents, embeddings, metadatas)
+            
+            # Cached retrieval results may now be stale
+            self._qcache_clear()
+            
             logger.info(f"Added {len(chunks)} chunks to vector database")
             
         except Exception as e:
             logger.error(f"Error adding documents to vector database: {str(e)}")
             raise EmbeddingError(f"Failed to add documents: {str(e)}")
     
+    def delete_stale_chunks(self, source_path: str, keep_ids: Set[str]) -> int:
+        """
+        Delete a document's stored chunks that its latest ingest did not produce.
+        
+        Args:
+            source_path: Document path recorded in chunk metadata
+            keep_ids: Chunk ids produced by the latest ingest of the document
+            
+        Returns:
+            Number of chunks deleted
+        """
+        try:
+            stored = self.collection.get(where={'source_path': source_path}, include=[])
+            stale = [chunk_id for chunk_id in stored['ids'] if chunk_id not in keep_ids]
+            if not stale:
+                return 0
+            
+            self.collection.delete(ids=stale)
+            if self.faiss_index is not None:
+                self.faiss_index.remove(stale)
+            self._qcache_clear()
+            
+            logger.info(f"Deleted {len(stale)} stale chunks of {source_path}")
+            return len(stale)
+            
+        except Exception as e:
+            logger.error(f"Error deleting stale chunks of {source_path}: {str(e)}")
+            raise EmbeddingError(f"Failed to delete stale chunks: {str(e)}")
+    
+    def _qcache_lookup(self, query_vec: np.ndarray, top_k: int) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for a query within the cosine-distance tolerance."""
+        with self._qcache_lock:
+            if self._qcache_count == 0:
+                return None
+            sims = self._qcache_keys[:self._qcache_count] @ query_vec
+            best = int(np.argmax(sims))
+            if 1.0 - float(sims[best]) > self._qcache_tolerance:
+                return None
+            cached_top_k, docs = self._qcache_vals[best]
+            # A hit must have retrieved at least as many results as requested
+            if cached_top_k < top_k:
+                return None
+            return list(docs[:top_k])
+    
+    def _qcache_insert(self, query_vec: np.ndarray, top_k: int, docs: List[Dict[str, Any]], generation: int) -> None:
+        """Insert a query result into the cache, evicting the oldest entry when full."""
+        if self._qcache_capacity <= 0:
+            return
+        with self._qcache_lock:
+            # The collection changed while this search ran; its results may be stale
+            if generation != self._qcache_generation:
+                return
+            if self._qcache_keys is None:
+                self._qcache_keys = np.zeros((self._qcache_capacity, query_vec.shape[0]), dtype=np.float32)
+                self._qcache_vals = [None] * self._qcache_capacity
+            self._qcache_keys[self._qcache_next] = query_vec
+            self._qcache_vals[self._qcache_next] = (top_k, docs)
+            self._qcache_next = (self._qcache_next + 1) % self._qcache_capacity
+            self._qcache_count = min(self._qcache_count + 1, self._qcache_capacity)
+    
+    def _qcache_clear(self) -> None:
+        """Drop all cached query results (the collection contents changed)."""
+        with self._qcache_lock:
+            self._qcache_keys = None
+            self._qcache_vals = []
+            self._qcache_count = 0
+            self._qcache_next = 0
+            self._qcache_generation += 1
+    
+    def _chroma_search(self, query_embedding: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        """Run a query against the ChromaDB collection."""
+        results = self.collection.query(
+            query_embeddings=[query_embedding.tolist()],
+            n_results=top_k
+        )
+        
+        # Format results
+        similar_docs = []
+        for i in range(len(results['ids'][0])):
+            doc = {
+                'id': results['ids'][0][i],
+                'content': results['documents'][0][i],
+                'metadata': results['metadatas'][0][i],
+                'distance': results['distances'][0][i] if 'distances' in results else None
+            }
+            similar_docs.append(doc)
+        return similar_docs
+    
     def search_similar(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Search for similar documents using semantic similarity.
@@ -118,29 +542,41 @@ class EmbeddingManager:
             query: Search query
             top_k: Number of results to return
             
+        Returns:
+            List of similar document chunks
+        """
+        # Create query embedding
+        query_embedding = self._query_vector(query)
+        return self.search_by_vector(query_embedding, top_k)
+    
+    def search_by_vector(self, query_embedding: Any, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search for similar documents using a precomputed query embedding.
+        
+        Args:
+            query_embedding: Query embedding vector (list or ndarray)
+            top_k: Number of results to return
+            
         Returns:
             List of similar document chunks
         """
         try:
-            # Create query embedding
-            query_embedding = self.create_embedding(query)
+            query_embedding = np.asarray(query_embedding, dtype=np.float32)
             
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
-            )
+            # Serve near-duplicate queries from the semantic cache
+            query_vec = query_embedding / (np.linalg.norm(query_embedding) or 1.0)
+            generation = self._qcache_generation
+            cached_docs = self._qcache_lookup(query_vec, top_k)
+            if cached_docs is not None:
+                logger.info(f"Found {len(cached_docs)} similar documents for query (query cache hit)")
+                return cached_docs
             
-            # Format results
-            similar_docs = []
-            for i in range(len(results['ids'][0])):
-                doc = {
-                    'id': results['ids'][0][i],
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if 'distances' in results else None
-                }
-                similar_docs.append(doc)
+            if self.faiss_index is not None:
+                similar_docs = self.faiss_index.search(query_vec, top_k)
+            else:
+                similar_docs = self._chroma_search(query_embedding, top_k)
+            
+            self._qcache_insert(query_vec, top_k, similar_docs, generation)
             
             logger.info(f"Found {len(similar_docs)} similar documents for query")
             return similar_docs
@@ -149,6 +585,10 @@ class EmbeddingManager:
             logger.error(f"Error searching similar documents: {str(e)}")
             raise EmbeddingError(f"Failed to search documents: {str(e)}")
     
+    async def asearch_by_vector(self, query_embedding: Any, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Async variant of search_by_vector; the search runs in a worker thread."""
+        return await asyncio.to_thread(self.search_by_vector, query_embedding, top_k)
+    
     def clear_collection(self) -> None:
         """Clear all documents from the collection."""
         try:
@@ -158,6 +598,9 @@ class EmbeddingManager:
                 name="documents",
                 metadata={"description": "Document embeddings for RAG chatbot"}
             )
+            if self.faiss_index is not None:
+                self.faiss_index.reset()
+            self._qcache_clear()
             logger.info("Cleared vector database")
         except Exception as e:
             logger.error(f"Error clearing collection: {str(e)}")
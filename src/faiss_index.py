@@ -0,0 +1,244 @@
+from typing import List, Dict, Any, Optional
+import json
+import threading
+from pathlib import Path
+import numpy as np
+from src.logging_utils import get_logger
+from src.error_handling import EmbeddingError
+
+logger = get_logger(__name__)
+
+class FaissIndex:
+    """
+    Optional FAISS HNSW index mirroring the ChromaDB collection for fast ANN search.
+    
+    Only the vectors and row ids are persisted; chunk text and metadata stay in
+    ChromaDB and are loaded back with hydrate() on startup.
+    """
+    
+    def __init__(self, index_path: Path, hnsw_m: int = 32):
+        try:
+            import faiss
+        except ImportError as e:
+            raise EmbeddingError(f"USE_FAISS requires faiss-cpu to be installed: {str(e)}")
+        
+        self._faiss = faiss
+        self.index_path = Path(index_path)
+        self.meta_path = self.index_path.with_suffix(".meta.json")
+        self.hnsw_m = hnsw_m
+        self.index = None
+        # Row-aligned with the FAISS index; replaced rows keep a None id
+        self.ids: List[Optional[str]] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._dead = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+    
+    def __len__(self) -> int:
+        return len(self._row_of)
+    
+    @property
+    def dead_rows(self) -> int:
+        """Rows left behind by replaced or removed chunks; searches over-fetch by this many."""
+        return self._dead
+    
+    def _load(self) -> None:
+        """Load a previously persisted index from disk, if present."""
+        if not (self.index_path.exists() and self.meta_path.exists()):
+            return
+        try:
+            self.index = self._faiss.read_index(str(self.index_path))
+            with open(self.meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            self.ids = meta['ids']
+            # Filled in from ChromaDB by hydrate()
+            self.documents = [None] * len(self.ids)
+            self.metadatas = [None] * len(self.ids)
+            self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids) if chunk_id is not None}
+            self._dead = len(self.ids) - len(self._row_of)
+            logger.info(f"Loaded FAISS index with {len(self._row_of)} vectors")
+        except Exception as e:
+            logger.warning(f"Could not load FAISS index, starting empty: {str(e)}")
+            self._clear()
+    
+    def live_ids(self) -> List[str]:
+        """Ids of the chunks currently searchable in the index."""
+        with self._lock:
+            return list(self._row_of)
+    
+    def hydrate(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> int:
+        """
+        Attach chunk text and metadata to rows loaded from disk.
+        
+        Args:
+            ids: Chunk identifiers
+            documents: Chunk contents
+            metadatas: Chunk metadata dictionaries
+        
+        Returns:
+            Number of rows that were filled in
+        """
+        filled = 0
+        with self._lock:
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                row = self._row_of.get(chunk_id)
+                if row is not None:
+                    self.documents[row] = document
+                    self.metadatas[row] = metadata
+                    filled += 1
+        return filled
+    
+    def save(self) -> None:
+        """Persist the index and its row ids if anything changed since the last save."""
+        with self._lock:
+            if not self._dirty or self.index is None:
+                return
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._faiss.write_index(self.index, str(self.index_path))
+            with open(self.meta_path, 'w', encoding='utf-8') as file:
+                json.dump({'ids': self.ids}, file)
+            self._dirty = False
+            logger.info(f"Saved FAISS index with {len(self._row_of)} vectors")
+    
+    def add(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Add or replace normalized embeddings with their documents and metadata.
+        
+        Changes are kept in memory; call save() once the ingest is done.
+        
+        Args:
+            ids: Chunk identifiers
+            documents: Chunk contents
+            embeddings: 2-D float32 array of L2-normalized embeddings
+            metadatas: Chunk metadata dictionaries
+        """
+        if not ids:
+            return
+        with self._lock:
+            vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+            if self.index is None:
+                # Inner product on unit vectors == cosine similarity
+                self.index = self._faiss.IndexHNSWFlat(vectors.shape[1], self.hnsw_m, self._faiss.METRIC_INNER_PRODUCT)
+            self.index.add(vectors)
+            
+            # HNSW cannot delete, so a replaced id leaves a dead row behind
+            for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                old_row = self._row_of.get(chunk_id)
+                if old_row is not None:
+                    self.ids[old_row] = None
+                    self._dead += 1
+                self._row_of[chunk_id] = len(self.ids)
+                self.ids.append(chunk_id)
+                self.documents.append(document)
+                self.metadatas.append(metadata)
+            self._dirty = True
+    
+    def rebuild(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Replace the whole index with a freshly built one that has no dead rows.
+        
+        The new graph is built outside the lock, so searches keep using the old
+        index until the swap.
+        
+        Args:
+            ids: Chunk identifiers
+            documents: Chunk contents
+            embeddings: 2-D float32 array of L2-normalized embeddings
+            metadatas: Chunk metadata dictionaries
+        """
+        index = None
+        if ids:
+            vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+            index = self._faiss.IndexHNSWFlat(vectors.shape[1], self.hnsw_m, self._faiss.METRIC_INNER_PRODUCT)
+            index.add(vectors)
+        with self._lock:
+            self.index = index
+            self.ids = list(ids)
+            self.documents = list(documents)
+            self.metadatas = list(metadatas)
+            self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+            self._dead = 0
+            self._dirty = index is not None
+        if index is None:
+            self.reset()
+    
+    def remove(self, ids: List[str]) -> None:
+        """
+        Remove chunks from the index.
+        
+        Args:
+            ids: Chunk identifiers to drop; unknown ids are ignored
+        """
+        with self._lock:
+            for chunk_id in ids:
+                row = self._row_of.pop(chunk_id, None)
+                if row is not None:
+                    self.ids[row] = None
+                    self._dead += 1
+                    self._dirty = True
+    
+    def search(self, query_vec: np.ndarray, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search the index with a normalized query vector.
+        
+        Args:
+            query_vec: 1-D float32 L2-normalized query embedding
+            top_k: Number of results to return
+        
+        Returns:
+            List of similar document chunks in the same shape as ChromaDB results
+        """
+        with self._lock:
+            if self.index is None or not self._row_of:
+                return []
+            # Over-fetch to make up for dead rows
+            k = min(top_k + self._dead, len(self.ids))
+            sims, rows = self.index.search(query_vec.reshape(1, -1).astype(np.float32, copy=False), k)
+            
+            similar_docs = []
+            for sim, row in zip(sims[0], rows[0]):
+                if row < 0 or self.ids[row] is None or self.documents[row] is None:
+                    continue
+                if len(similar_docs) == top_k:
+                    break
+                similar_docs.append({
+                    'id': self.ids[row],
+                    'content': self.documents[row],
+                    'metadata': self.metadatas[row],
+                    # Report squared L2 like ChromaDB: 2 - 2 * cos for unit vectors
+                    'distance': float(2.0 - 2.0 * sim)
+                })
+            return similar_docs
+    
+    def _clear(self) -> None:
+        """Reset in-memory state."""
+        self.index = None
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self._row_of = {}
+        self._dead = 0
+        self._dirty = False
+    
+    def reset(self) -> None:
+        """Drop all vectors from the index and remove the persisted files."""
+        with self._lock:
+            self._clear()
+            for path in (self.index_path, self.meta_path):
+                if path.exists():
+                    path.unlink()
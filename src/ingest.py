@@ -1,12 +1,23 @@
+import codecs
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, BinaryIO, Iterator
+import logging
 import PyPDF2
-from src.logging_utils import get_logger
+from src.logging_utils import get_logger, forward_worker_logs, init_worker_logging
 from src.error_handling import DocumentIngestionError
 
 logger = get_logger(__name__)
 
+def _ingest_one(file_path: str) -> Optional[Dict[str, Any]]:
+    """Ingest a single file in a worker process, returning None if it is skipped."""
+    try:
+        return DocumentIngester().ingest_document(file_path)
+    except DocumentIngestionError as e:
+        logger.warning(f"Skipping file {file_path}: {str(e)}")
+        return None
+
 class DocumentIngester:
     """Handles loading and extracting text from various document formats."""
     
@@ -50,19 +61,136 @@ class DocumentIngester:
             logger.error(f"Error ingesting document {file_path}: {str(e)}")
             raise DocumentIngestionError(f"Failed to ingest document: {str(e)}")
     
+    def ingest_stream(self, file_name: str, file_obj: BinaryIO) -> Dict[str, Any]:
+        """
+        Ingest a document from an open binary stream without writing it to disk.
+        
+        Args:
+            file_name: Original file name, used for type detection and metadata
+            file_obj: Binary file-like object positioned at the start of the document
+            
+        Returns:
+            Dictionary containing document metadata and content
+        """
+        try:
+            extension = Path(file_name).suffix.lower()
+            if extension not in self.supported_extensions:
+                raise DocumentIngestionError(f"Unsupported file type: {extension}")
+            
+            logger.info(f"Ingesting uploaded document: {file_name}")
+            
+            content = "".join(self.stream_upload(file_name, file_obj)).strip()
+            
+            file_obj.seek(0, os.SEEK_END)
+            
+            return {
+                'file_path': file_name,
+                'file_name': Path(file_name).name,
+                'content': content,
+                'file_size': file_obj.tell(),
+                'extension': extension
+            }
+            
+        except Exception as e:
+            logger.error(f"Error ingesting uploaded document {file_name}: {str(e)}")
+            raise DocumentIngestionError(f"Failed to ingest document: {str(e)}")
+    
+    def stream_document(self, file_path: str) -> Iterator[str]:
+        """
+        Stream a document's text in blocks instead of loading it all at once.
+        
+        Args:
+            file_path: Path to the document file
+            
+        Returns:
+            Iterator of text blocks (PDF pages or ~1 MiB of decoded text)
+        """
+        path = Path(file_path)
+        if not path.exists():
+            raise DocumentIngestionError(f"File not found: {file_path}")
+        
+        if path.suffix.lower() not in self.supported_extensions:
+            raise DocumentIngestionError(f"Unsupported file type: {path.suffix}")
+        
+        logger.info(f"Streaming document: {file_path}")
+        
+        if path.suffix.lower() == '.pdf':
+            return self._iter_pdf_pages(path)
+        return self._iter_txt_blocks(path)
+    
+    def stream_upload(self, file_name: str, file_obj: BinaryIO) -> Iterator[str]:
+        """
+        Stream an uploaded document's text in blocks without writing it to disk.
+        
+        Args:
+            file_name: Original file name, used for type detection
+            file_obj: Binary file-like object positioned at the start of the document
+            
+        Returns:
+            Iterator of text blocks (PDF pages or ~1 MiB of decoded text)
+        """
+        extension = Path(file_name).suffix.lower()
+        if extension not in self.supported_extensions:
+            raise DocumentIngestionError(f"Unsupported file type: {extension}")
+        
+        if extension == '.pdf':
+            return self._iter_pdf_stream(file_obj, file_name)
+        return self._iter_txt_stream(file_obj, file_name)
+    
+    def _iter_pdf_pages(self, file_path: Path) -> Iterator[str]:
+        """Yield the text of each PDF page."""
+        with open(file_path, 'rb') as file:
+            yield from self._iter_pdf_stream(file, str(file_path))
+    
+    def _iter_pdf_stream(self, file_obj: BinaryIO, label: str) -> Iterator[str]:
+        """Yield the text of each page of a binary PDF stream."""
+        try:
+            pdf_reader = PyPDF2.PdfReader(file_obj)
+            for page in pdf_reader.pages:
+                yield (page.extract_text() or "") + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming document {label}: {str(e)}")
+            raise DocumentIngestionError(f"Failed to ingest document: {str(e)}")
+    
+    def _iter_txt_blocks(self, file_path: Path) -> Iterator[str]:
+        """Yield decoded blocks of a TXT file."""
+        with open(file_path, 'rb') as file:
+            yield from self._iter_txt_stream(file, str(file_path))
+    
+    def _iter_txt_stream(self, file_obj: BinaryIO, label: str, block_size: int = 1 << 20) -> Iterator[str]:
+        """Yield decoded blocks of a binary TXT stream."""
+        try:
+            # Incremental decoder keeps multi-byte characters intact across blocks
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            while True:
+                data = file_obj.read(block_size)
+                if not data:
+                    break
+                yield decoder.decode(data)
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+        except Exception as e:
+            logger.error(f"Error streaming document {label}: {str(e)}")
+            raise DocumentIngestionError(f"Failed to ingest document: {str(e)}")
+    
     def _extract_pdf_text(self, file_path: Path) -> str:
         """Extract text from PDF file."""
-        text = ""
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text.strip()
+            return self._extract_pdf_stream(file)
+    
+    def _extract_pdf_stream(self, file_obj: BinaryIO) -> str:
+        """Extract text from a binary PDF stream."""
+        pdf_reader = PyPDF2.PdfReader(file_obj)
+        # Collect pages and join once instead of repeated concatenation
+        pages = [page.extract_text() or "" for page in pdf_reader.pages]
+        return "\n".join(pages).strip()
     
     def _extract_txt_text(self, file_path: Path) -> str:
         """Extract text from TXT file."""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read().strip()
+        # Read raw bytes and decode in a single pass
+        with open(file_path, 'rb') as file:
+            return file.read().decode('utf-8', errors='replace').strip()
     
     def ingest_directory(self, directory_path: str) -> List[Dict[str, Any]]:
         """
@@ -74,19 +202,32 @@ class DocumentIngester:
         Returns:
             List of document dictionaries
         """
-        documents = []
         directory = Path(directory_path)
         
         if not directory.exists():
             raise DocumentIngestionError(f"Directory not found: {directory_path}")
         
-        for file_path in directory.rglob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in self.supported_extensions:
-                try:
-                    doc = self.ingest_document(str(file_path))
-                    documents.append(doc)
-                except DocumentIngestionError as e:
-                    logger.warning(f"Skipping file {file_path}: {str(e)}")
+        file_paths = [
+            str(file_path) for file_path in directory.rglob("*")
+            if file_path.is_file() and file_path.suffix.lower() in self.supported_extensions
+        ]
+        
+        # Parse files in parallel; text extraction is CPU-bound
+        if len(file_paths) > 1:
+            log_queue, listener = forward_worker_logs()
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=min(len(file_paths), os.cpu_count() or 1),
+                    initializer=init_worker_logging,
+                    initargs=(log_queue, logging.getLogger().getEffectiveLevel())
+                ) as executor:
+                    results = list(executor.map(_ingest_one, file_paths))
+            finally:
+                listener.stop()
+        else:
+            results = [_ingest_one(file_path) for file_path in file_paths]
+        
+        documents = [doc for doc in results if doc is not None]
         
         logger.info(f"Ingested {len(documents)} documents from {directory_path}")
         return documents
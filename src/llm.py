@@ -1,11 +1,61 @@
 from typing import List, Dict, Any, Optional, AsyncGenerator
-from openai import OpenAI
+import asyncio
+import atexit
+import threading
+import time
+import httpx
+from openai import OpenAI, AsyncOpenAI
 from config.settings import settings
 from src.logging_utils import get_logger
 from src.error_handling import LLMError
 
 logger = get_logger(__name__)
 
+# Shared keep-alive HTTP/2 pools so every LLMWrapper reuses TLS sessions to OpenRouter
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+_SHARED_HTTP = httpx.Client(http2=True, timeout=60, limits=_HTTP_LIMITS)
+_SHARED_ASYNC_HTTP = httpx.AsyncClient(http2=True, timeout=60, limits=_HTTP_LIMITS)
+
+atexit.register(_SHARED_HTTP.close)
+
+# System prompts are byte-stable module constants so provider-side prefix
+# caching can reuse the prefill across requests
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant that answers questions based on the provided context.\n"
+    "Follow these guidelines:\n"
+    "1. Answer questions based primarily on the provided context\n"
+    "2. If the context doesn't contain enough information, say so clearly\n"
+    "3. Be concise but informative\n"
+    "4. Cite sources when possible\n"
+    "5. If asked about something not in the context, politely explain the limitation"
+)
+GENERAL_SYSTEM_PROMPT = "You are a helpful, friendly AI assistant. Answer questions clearly and concisely."
+SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant that creates concise summaries of documents."
+
+# Prebuilt system messages shared by every request. These are plain dicts because the
+# request body is JSON-encoded (a MappingProxyType would not serialize); never mutate them.
+_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}
+_GENERAL_SYSTEM_MSG = {"role": "system", "content": GENERAL_SYSTEM_PROMPT}
+_SUMMARY_SYSTEM_MSG = {"role": "system", "content": SUMMARY_SYSTEM_PROMPT}
+
+# Consecutive primary-model failures that open the circuit breaker, and how
+# long requests then go straight to the fallback model
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 30.0
+
+def _message_text(message: Any) -> str:
+    """Return a completion message's text, stripping only when it has surrounding whitespace."""
+    content = message.content
+    if content is None:
+        raise LLMError("Model returned an empty message")
+    if content and (content[0].isspace() or content[-1].isspace()):
+        return content.strip()
+    return content
+
+async def aclose_shared_clients() -> None:
+    """Close the shared async HTTP pool (call from the event loop on shutdown)."""
+    await _SHARED_ASYNC_HTTP.aclose()
+
 class LLMWrapper:
     """Wrapper for Large Language Model operations using OpenRouter API with Amazon Nova reasoning."""
     
@@ -13,13 +63,124 @@ class LLMWrapper:
         # OpenRouter uses OpenAI-compatible API
         self.client = OpenAI(
             api_key=settings.openrouter_api_key,
-            base_url=settings.openrouter_base_url
+            base_url=settings.openrouter_base_url,
+            http_client=_SHARED_HTTP
+        )
+        self.aclient = AsyncOpenAI(
+            api_key=settings.openrouter_api_key,
+            base_url=settings.openrouter_base_url,
+            http_client=_SHARED_ASYNC_HTTP
         )
         self.model = settings.llm_model
         self.fallback_model = settings.llm_fallback_model
         self.enable_reasoning = "amazon/nova" in self.model.lower()  # Enable reasoning for Nova models
+        self._last_prewarm = 0.0
+        self._breaker = {'primary_fails': 0, 'open_until': 0.0}
+        self._breaker_lock = threading.Lock()
+        self._prewarm_tasks = set()
         logger.info(f"Initialized LLM with model: {self.model} (reasoning: {self.enable_reasoning})")
     
+    def _rag_request(
+        self,
+        query: str,
+        context_documents: List[Dict[str, Any]],
+        conversation_history: Optional[List[Dict[str, str]]],
+        use_fallback: bool
+    ) -> Dict[str, Any]:
+        """Build chat completion arguments for a RAG answer."""
+        # Build context from retrieved documents
+        context = self._build_context(context_documents)
+        
+        # Build conversation messages
+        messages = self._build_messages(query, context, conversation_history)
+        
+        # Select model
+        model = self.fallback_model if use_fallback else self.model
+        enable_reasoning = self.enable_reasoning and not use_fallback
+        
+        # Generate response using OpenRouter (OpenAI-compatible API)
+        extra_body = {"reasoning": {"enabled": True}} if enable_reasoning else {}
+        
+        return {
+            "model": model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 2000,
+            "stream": False,
+            "extra_body": extra_body
+        }
+    
+    def schedule_prewarm(self) -> None:
+        """
+        Start a background prewarm of the RAG model if enabled, not done recently,
+        and the primary model is not behind an open circuit breaker.
+        
+        Must be called from a running event loop. The task is not awaited, so a
+        slow prewarm never delays the real request.
+        """
+        # The breaker routes real requests to the fallback model, so warming the primary is wasted
+        if not settings.llm_prewarm or not self._primary_available():
+            return
+        now = time.monotonic()
+        if now - self._last_prewarm < settings.llm_prewarm_interval:
+            return
+        self._last_prewarm = now
+        task = asyncio.get_running_loop().create_task(self.aprewarm())
+        # Keep a reference until the task finishes so it is not garbage collected
+        self._prewarm_tasks.add(task)
+        task.add_done_callback(self._prewarm_tasks.discard)
+    
+    async def aprewarm(self) -> None:
+        """Send a minimal completion with the RAG system prompt to warm the connection and prefix cache."""
+        try:
+            await self.aclient.chat.completions.create(
+                model=self.model,
+                messages=[_SYSTEM_MSG, {"role": "user", "content": "ping"}],
+                max_tokens=1,
+                temperature=0
+            )
+            logger.debug("Prewarmed LLM connection")
+        except Exception as e:
+            logger.debug(f"LLM prewarm failed: {str(e)}")
+    
+    def _primary_available(self) -> bool:
+        """Whether the circuit breaker currently lets requests reach the primary model."""
+        return time.monotonic() >= self._breaker['open_until']
+    
+    def _record_primary_result(self, success: bool) -> None:
+        """Update the circuit breaker after a primary-model call."""
+        with self._breaker_lock:
+            breaker = self._breaker
+            if success:
+                if breaker['open_until']:
+                    logger.warning(f"Primary model {self.model} recovered, closing circuit breaker")
+                breaker['primary_fails'] = 0
+                breaker['open_until'] = 0.0
+                return
+            
+            breaker['primary_fails'] += 1
+            now = time.monotonic()
+            if breaker['primary_fails'] >= BREAKER_FAILURE_THRESHOLD and now >= breaker['open_until']:
+                breaker['open_until'] = now + BREAKER_COOLDOWN_SECONDS
+                logger.warning(
+                    f"Primary model {self.model} failed {breaker['primary_fails']} times in a row, "
+                    f"using fallback model for {BREAKER_COOLDOWN_SECONDS:.0f}s"
+                )
+    
+    def _attempts(self, use_fallback: bool, has_fallback: bool = True) -> List[bool]:
+        """Models to try in order, as use_fallback flags, skipping the primary while the breaker is open."""
+        if use_fallback:
+            return [True]
+        if not has_fallback:
+            return [False]
+        return [False, True] if self._primary_available() else [True]
+    
+    def _log_reasoning(self, message: Any, label: str) -> None:
+        """Log reasoning details if the model returned them."""
+        reasoning_details = getattr(message, 'reasoning_details', None)
+        if reasoning_details:
+            logger.info(f"{label}: {getattr(reasoning_details, 'tokens', 'N/A')}")
+    
     def generate_response(
         self, 
         query: str, 
@@ -39,45 +200,72 @@ class LLMWrapper:
         Returns:
             Generated response
         """
-        try:
-            # Build context from retrieved documents
-            context = self._build_context(context_documents)
-            
-            # Build conversation messages
-            messages = self._build_messages(query, context, conversation_history)
-            
-            # Select model
-            model = self.fallback_model if use_fallback else self.model
-            enable_reasoning = self.enable_reasoning and not use_fallback
-            
-            # Generate response using OpenRouter (OpenAI-compatible API)
-            extra_body = {"reasoning": {"enabled": True}} if enable_reasoning else {}
-            
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=2000,
-                stream=False,
-                extra_body=extra_body
-            )
-            
-            answer = response.choices[0].message.content.strip()
-            
-            # Log reasoning details if available
-            if hasattr(response.choices[0].message, 'reasoning_details') and response.choices[0].message.reasoning_details:
-                logger.info(f"Reasoning tokens: {getattr(response.choices[0].message.reasoning_details, 'tokens', 'N/A')}")
-            
-            logger.info(f"Generated response for query: {query[:50]}...")
-            return answer
+        last_error = None
+        for fallback in self._attempts(use_fallback):
+            try:
+                request = self._rag_request(query, context_documents, conversation_history, fallback)
+                response = self.client.chat.completions.create(**request)
+                
+                msg = response.choices[0].message
+                answer = _message_text(msg)
+                self._log_reasoning(msg, "Reasoning tokens")
+                if not fallback:
+                    self._record_primary_result(True)
+                
+                logger.info(f"Generated response for query: {query[:50]}...")
+                return answer
+                
+            except Exception as e:
+                last_error = e
+                logger.error(f"Error generating LLM response: {str(e)}")
+                if not fallback:
+                    self._record_primary_result(False)
+                    logger.info("Retrying with fallback model...")
+        
+        raise LLMError(f"Failed to generate response: {str(last_error)}")
+    
+    async def agenerate_response(
+        self, 
+        query: str, 
+        context_documents: List[Dict[str, Any]], 
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        use_fallback: bool = False
+    ) -> str:
+        """
+        Async variant of generate_response that does not block the event loop.
+        
+        Args:
+            query: User's question
+            context_documents: Retrieved relevant documents
+            conversation_history: Previous conversation turns
+            use_fallback: Use fallback model if True
             
-        except Exception as e:
-            logger.error(f"Error generating LLM response: {str(e)}")
-            # Try fallback model if main model fails
-            if not use_fallback:
-                logger.info("Retrying with fallback model...")
-                return self.generate_response(query, context_documents, conversation_history, use_fallback=True)
-            raise LLMError(f"Failed to generate response: {str(e)}")
+        Returns:
+            Generated response
+        """
+        last_error = None
+        for fallback in self._attempts(use_fallback):
+            try:
+                request = self._rag_request(query, context_documents, conversation_history, fallback)
+                response = await self.aclient.chat.completions.create(**request)
+                
+                msg = response.choices[0].message
+                answer = _message_text(msg)
+                self._log_reasoning(msg, "Reasoning tokens")
+                if not fallback:
+                    self._record_primary_result(True)
+                
+                logger.info(f"Generated response for query: {query[:50]}...")
+                return answer
+                
+            except Exception as e:
+                last_error = e
+                logger.error(f"Error generating LLM response: {str(e)}")
+                if not fallback:
+                    self._record_primary_result(False)
+                    logger.info("Retrying with fallback model...")
+        
+        raise LLMError(f"Failed to generate response: {str(last_error)}")
     
     def _build_context(self, context_documents: List[Dict[str, Any]]) -> str:
         """Build context string from retrieved documents."""
@@ -99,16 +287,8 @@ class LLMWrapper:
         conversation_history: Optional[List[Dict[str, str]]] = None
     ) -> List[Dict[str, str]]:
         """Build message list for the chat completion API."""
-        
-        system_prompt = """You are a helpful AI assistant that answers questions based on the provided context. 
-        Follow these guidelines:
-        1. Answer questions based primarily on the provided context
-        2. If the context doesn't contain enough information, say so clearly
-        3. Be concise but informative
-        4. Cite sources when possible
-        5. If asked about something not in the context, politely explain the limitation"""
-        
-        messages = [{"role": "system", "content": system_prompt}]
+        # Order is [system][history][context + question] so the stable prefix comes first
+        messages = [_SYSTEM_MSG]
         
         # Add conversation history
         if conversation_history:
@@ -147,7 +327,7 @@ class LLMWrapper:
             messages = self._build_messages(query, context, conversation_history)
             
             # Generate streaming response
-            stream = self.client.chat.completions.create(
+            stream = await self.aclient.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=0.7,
@@ -155,14 +335,55 @@ class LLMWrapper:
                 stream=True
             )
             
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            # Dynamic batching: the first delta goes out alone (fast first token),
+            # then batches grow geometrically up to the cap. A short idle timeout
+            # flushes whatever is buffered when the model pauses.
+            buffer = []
+            flush_size = settings.stream_min_batch_size
+            iterator = stream.__aiter__()
+            pending = None
+            try:
+                while True:
+                    if pending is None:
+                        pending = asyncio.ensure_future(iterator.__anext__())
+                    try:
+                        chunk = await asyncio.wait_for(asyncio.shield(pending), settings.stream_batch_timeout)
+                    except asyncio.TimeoutError:
+                        if buffer:
+                            yield "".join(buffer)
+                            buffer.clear()
+                        continue
+                    except StopAsyncIteration:
+                        break
+                    pending = None
+                    
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        buffer.append(content)
+                        if len(buffer) >= flush_size:
+                            yield "".join(buffer)
+                            buffer.clear()
+                            flush_size = min(flush_size * 3, settings.stream_max_batch_size)
+            finally:
+                if pending is not None and not pending.done():
+                    pending.cancel()
+                # Release the HTTP response back to the shared pool, also when the client disconnects
+                await stream.close()
+            
+            if buffer:
+                yield "".join(buffer)
                     
         except Exception as e:
             logger.error(f"Error generating streaming response: {str(e)}")
             raise LLMError(f"Failed to generate streaming response: {str(e)}")
     
+    def _summary_messages(self, document_content: str) -> List[Dict[str, str]]:
+        """Build message list for a document summary."""
+        return [
+            _SUMMARY_SYSTEM_MSG,
+            {"role": "user", "content": f"Please provide a concise summary of the following document:\n\n{document_content}"}
+        ]
+    
     def summarize_document(self, document_content: str) -> str:
         """
         Generate a summary of a document.
@@ -174,19 +395,40 @@ class LLMWrapper:
             Document summary
         """
         try:
-            messages = [
-                {"role": "system", "content": "You are a helpful assistant that creates concise summaries of documents."},
-                {"role": "user", "content": f"Please provide a concise summary of the following document:\n\n{document_content}"}
-            ]
-            
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
+                messages=self._summary_messages(document_content),
+                temperature=0.3,
+                max_tokens=500
+            )
+            
+            summary = _message_text(response.choices[0].message)
+            logger.info("Generated document summary")
+            return summary
+            
+        except Exception as e:
+            logger.error(f"Error generating summary: {str(e)}")
+            raise LLMError(f"Failed to generate summary: {str(e)}")
+    
+    async def asummarize_document(self, document_content: str) -> str:
+        """
+        Async variant of summarize_document.
+        
+        Args:
+            document_content: Full document content
+            
+        Returns:
+            Document summary
+        """
+        try:
+            response = await self.aclient.chat.completions.create(
+                model=self.model,
+                messages=self._summary_messages(document_content),
                 temperature=0.3,
                 max_tokens=500
             )
             
-            summary = response.choices[0].message.content.strip()
+            summary = _message_text(response.choices[0].message)
             logger.info("Generated document summary")
             return summary
             
@@ -194,6 +436,51 @@ class LLMWrapper:
             logger.error(f"Error generating summary: {str(e)}")
             raise LLMError(f"Failed to generate summary: {str(e)}")
     
+    async def batch_summarize(self, documents: List[str]) -> List[str]:
+        """
+        Summarize several documents concurrently.
+        
+        Args:
+            documents: Document contents to summarize
+            
+        Returns:
+            Summaries in the same order as the input
+        """
+        return await asyncio.gather(*(self.asummarize_document(doc) for doc in documents))
+    
+    def _general_messages(
+        self, 
+        query: str, 
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """Build message list for a general chat response."""
+        messages = [_GENERAL_SYSTEM_MSG]
+        
+        # Add conversation history
+        if conversation_history:
+            for turn in conversation_history[-5:]:
+                messages.append({"role": "user", "content": turn.get("user", "")})
+                messages.append({"role": "assistant", "content": turn.get("assistant", "")})
+        
+        # Add current query
+        messages.append({"role": "user", "content": query})
+        return messages
+    
+    def _general_request(self, messages: List[Dict[str, str]], use_fallback: bool) -> Dict[str, Any]:
+        """Build chat completion arguments for a general chat response."""
+        if use_fallback:
+            return {"model": self.fallback_model, "messages": messages, "temperature": 0.7, "max_tokens": 2000}
+        
+        # Enable reasoning for Nova models
+        extra_body = {"reasoning": {"enabled": True}} if self.enable_reasoning else {}
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 2000,
+            "extra_body": extra_body
+        }
+    
     def generate_general_response(
         self, 
         query: str, 
@@ -209,59 +496,79 @@ class LLMWrapper:
         Returns:
             Generated response string
         """
-        try:
-            logger.info(f"Generating general chat response for: {query[:50]}...")
-            
-            messages = [
-                {"role": "system", "content": "You are a helpful, friendly AI assistant. Answer questions clearly and concisely."}
-            ]
-            
-            # Add conversation history
-            if conversation_history:
-                for turn in conversation_history[-5:]:
-                    messages.append({"role": "user", "content": turn.get("user", "")})
-                    messages.append({"role": "assistant", "content": turn.get("assistant", "")})
-            
-            # Add current query
-            messages.append({"role": "user", "content": query})
-            
-            # Try main model
+        logger.info(f"Generating general chat response for: {query[:50]}...")
+        messages = self._general_messages(query, conversation_history)
+        
+        last_error = None
+        for fallback in self._attempts(False, has_fallback=bool(self.fallback_model)):
             try:
-                # Enable reasoning for Nova models
-                extra_body = {"reasoning": {"enabled": True}} if self.enable_reasoning else {}
+                response = self.client.chat.completions.create(**self._general_request(messages, fallback))
+                msg = response.choices[0].message
+                answer = _message_text(msg)
                 
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=2000,
-                    extra_body=extra_body
-                )
-                answer = response.choices[0].message.content.strip()
+                if fallback:
+                    logger.info(f"Generated response with fallback model")
+                else:
+                    # Log reasoning if available
+                    self._log_reasoning(msg, "Used reasoning mode - tokens")
+                    self._record_primary_result(True)
+                    logger.info(f"Generated general response")
+                return answer
                 
-                # Log reasoning if available
-                if hasattr(response.choices[0].message, 'reasoning_details') and response.choices[0].message.reasoning_details:
-                    logger.info(f"Used reasoning mode - tokens: {getattr(response.choices[0].message.reasoning_details, 'tokens', 'N/A')}")
+            except Exception as e:
+                last_error = e
+                if fallback:
+                    logger.error(f"Error generating general response: {str(e)}")
+                else:
+                    logger.error(f"Error with main model: {str(e)}")
+                    self._record_primary_result(False)
+                    if self.fallback_model:
+                        logger.info("Retrying with fallback model...")
+        
+        raise LLMError(f"Failed to generate response: {str(last_error)}")
+    
+    async def agenerate_general_response(
+        self, 
+        query: str, 
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """
+        Async variant of generate_general_response.
+        
+        Args:
+            query: User's question
+            conversation_history: Previous conversation turns
+            
+        Returns:
+            Generated response string
+        """
+        logger.info(f"Generating general chat response for: {query[:50]}...")
+        messages = self._general_messages(query, conversation_history)
+        
+        last_error = None
+        for fallback in self._attempts(False, has_fallback=bool(self.fallback_model)):
+            try:
+                response = await self.aclient.chat.completions.create(**self._general_request(messages, fallback))
+                msg = response.choices[0].message
+                answer = _message_text(msg)
                 
-                logger.info(f"Generated general response")
+                if fallback:
+                    logger.info(f"Generated response with fallback model")
+                else:
+                    # Log reasoning if available
+                    self._log_reasoning(msg, "Used reasoning mode - tokens")
+                    self._record_primary_result(True)
+                    logger.info(f"Generated general response")
                 return answer
                 
             except Exception as e:
-                logger.error(f"Error with main model: {str(e)}")
-                if self.fallback_model:
-                    logger.info("Retrying with fallback model...")
-                    response = self.client.chat.completions.create(
-                        model=self.fallback_model,
-                        messages=messages,
-                        temperature=0.7,
-                        max_tokens=2000
-                    )
-                    answer = response.choices[0].message.content.strip()
-                    logger.info(f"Generated response with fallback model")
-                    return answer
+                last_error = e
+                if fallback:
+                    logger.error(f"Error generating general response: {str(e)}")
                 else:
-                    raise
-                    
-        except Exception as e:
-            logger.error(f"Error generating general response: {str(e)}")
-            raise LLMError(f"Failed to generate response: {str(e)}")
+                    logger.error(f"Error with main model: {str(e)}")
+                    self._record_primary_result(False)
+                    if self.fallback_model:
+                        logger.info("Retrying with fallback model...")
+        
+        raise LLMError(f"Failed to generate response: {str(last_error)}")
@@ -1,10 +1,20 @@
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
+import queue
 import sys
 from pathlib import Path
+from typing import Any, Tuple
 from config.settings import settings
 
+_listener = None
+
 def setup_logging():
     """Configure structured logging for the application."""
+    global _listener
+    if _listener is not None:
+        return logging.getLogger()
     
     # Create logs directory if it doesn't exist
     Path(settings.log_file).parent.mkdir(parents=True, exist_ok=True)
@@ -25,11 +35,42 @@ def setup_logging():
     # Root logger configuration
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, settings.log_level.upper()))
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    
+    # Callers only enqueue records; a background thread does the file/console I/O
+    log_queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
     
     return root_logger
 
+def forward_worker_logs() -> Tuple[Any, logging.handlers.QueueListener]:
+    """
+    Start routing log records from worker processes into this process's handlers.
+    
+    Worker processes must be started with init_worker_logging(queue, level);
+    stop the returned listener once the workers have exited.
+    
+    Returns:
+        The multiprocessing queue for workers and the running listener
+    """
+    log_queue = multiprocessing.Queue(-1)
+    listener = logging.handlers.QueueListener(
+        log_queue, *logging.getLogger().handlers, respect_handler_level=True
+    )
+    listener.start()
+    return log_queue, listener
+
+def init_worker_logging(log_queue: Any, level: int) -> None:
+    """Process-pool initializer that sends a worker's log records back to the parent."""
+    # A forked worker inherits the parent's QueueHandler, whose queue nothing drains here
+    root_logger = logging.getLogger()
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root_logger.setLevel(level)
+
 def get_logger(name: str):
     """Get a logger instance for a specific module."""
     return logging.getLogger(name)
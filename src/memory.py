@@ -1,16 +1,32 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Deque, Tuple
+import sqlite3
+import threading
+import time
 import uuid
-from datetime import datetime
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from itertools import islice
+from config.settings import settings
 from src.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+def format_timestamp(timestamp_ns: int) -> str:
+    """Format a stored nanosecond timestamp as an ISO 8601 UTC string."""
+    return datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).isoformat()
+
 class ConversationMemory:
     """Manages conversation history using in-memory storage."""
     
     def __init__(self, user_id: Optional[str] = None):
         self.user_id = user_id
-        self.conversations: Dict[str, List[Dict[str, Any]]] = {}
+        self.conversations: Dict[str, Deque[Dict[str, Any]]] = {}
+        # Per-conversation summary kept up to date on every turn
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        # Query embeddings aligned with each conversation's turns, kept out of
+        # the turn dicts so history stays JSON-serializable
+        self._embeddings: Dict[str, Deque[Optional[bytes]]] = {}
+        self._max_history = settings.max_history or None
     
     def create_conversation(self, title: Optional[str] = None) -> str:
         """
@@ -20,7 +36,8 @@ class ConversationMemory:
             Conversation ID
         """
         conversation_id = str(uuid.uuid4())
-        self.conversations[conversation_id] = []
+        self.conversations[conversation_id] = deque(maxlen=self._max_history)
+        self._embeddings[conversation_id] = deque(maxlen=self._max_history)
         logger.info(f"Created new conversation: {conversation_id}")
         return conversation_id
     
@@ -28,7 +45,8 @@ class ConversationMemory:
         self, 
         conversation_id: str, 
         user_message: str, 
-        assistant_message: str
+        assistant_message: str,
+        query_embedding: Optional[bytes] = None
     ) -> None:
         """
         Add a conversation turn to the history.
@@ -37,18 +55,35 @@ class ConversationMemory:
             conversation_id: Conversation identifier
             user_message: User's message
             assistant_message: Assistant's response
+            query_embedding: Raw float32 bytes of the question embedding, if computed
         """
         if conversation_id not in self.conversations:
-            self.conversations[conversation_id] = []
+            self.conversations[conversation_id] = deque(maxlen=self._max_history)
+            self._embeddings[conversation_id] = deque(maxlen=self._max_history)
         
         turn = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp_ns': time.time_ns(),
             'user': user_message,
             'assistant': assistant_message
         }
         
         self.conversations[conversation_id].append(turn)
-        logger.info(f"Added turn to conversation {conversation_id}")
+        self._embeddings[conversation_id].append(query_embedding)
+        
+        meta = self._meta.get(conversation_id)
+        if meta is None:
+            self._meta[conversation_id] = {
+                'conversation_id': conversation_id,
+                'title': 'Local Chat',
+                'created_at': turn['timestamp_ns'],
+                'last_updated': turn['timestamp_ns'],
+                'message_count': 1,
+                'preview': user_message[:100] + "..." if len(user_message) > 100 else user_message
+            }
+        else:
+            meta['last_updated'] = turn['timestamp_ns']
+            meta['message_count'] += 1
+        logger.debug(f"Added turn to conversation {conversation_id}")
     
     def get_conversation_history(
         self, 
@@ -71,9 +106,21 @@ class ConversationMemory:
         history = self.conversations[conversation_id]
         
         if max_turns:
-            history = history[-max_turns:]
+            return list(islice(history, max(0, len(history) - max_turns), None))
+        
+        return list(history)
+    
+    def get_turn_embeddings(self, conversation_id: str) -> List[Optional[bytes]]:
+        """
+        Get the stored question embeddings for a conversation, one per turn.
         
-        return history
+        Args:
+            conversation_id: Conversation identifier
+            
+        Returns:
+            List of float32 embedding bytes (None where no embedding was recorded)
+        """
+        return list(self._embeddings.get(conversation_id, ()))
     
     def delete_conversation(self, conversation_id: str) -> bool:
         """
@@ -87,6 +134,8 @@ class ConversationMemory:
         """
         if conversation_id in self.conversations:
             del self.conversations[conversation_id]
+            self._meta.pop(conversation_id, None)
+            self._embeddings.pop(conversation_id, None)
             logger.info(f"Deleted conversation {conversation_id}")
             return True
         return False
@@ -98,23 +147,248 @@ class ConversationMemory:
         Returns:
             List of conversation metadata
         """
-        conversations = []
-        for conv_id, history in self.conversations.items():
-            if history:
-                first_turn = history[0]
-                last_turn = history[-1]
-                conversations.append({
-                    'conversation_id': conv_id,
-                    'title': 'Local Chat',
-                    'created_at': first_turn['timestamp'],
-                    'last_updated': last_turn['timestamp'],
-                    'message_count': len(history),
-                    'preview': history[0]['user'][:100] + "..." if len(history[0]['user']) > 100 else history[0]['user']
-                })
-        
-        return conversations
+        return [
+            {
+                **meta,
+                'created_at': format_timestamp(meta['created_at']),
+                'last_updated': format_timestamp(meta['last_updated'])
+            }
+            for meta in self._meta.values()
+        ]
     
     def clear_all_conversations(self) -> None:
         """Clear all conversations from memory."""
         self.conversations.clear()
+        self._meta.clear()
+        self._embeddings.clear()
+        logger.info("Cleared all conversations")
+
+class SQLiteConversationMemory:
+    """Manages conversation history in SQLite (WAL mode) so it is durable and shared across workers."""
+    
+    def __init__(self, user_id: Optional[str] = None, db_path: Optional[str] = None, cache_size: int = 128):
+        self.user_id = user_id
+        self._max_history = settings.max_history or None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(db_path or settings.conversation_db_path),
+            check_same_thread=False
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS conversations (
+                    cid TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    title TEXT,
+                    created_at INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cid TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    user TEXT,
+                    assistant TEXT,
+                    query_embedding BLOB
+                );
+                CREATE INDEX IF NOT EXISTS idx_turns_cid ON turns(cid);
+                """
+            )
+            self._conn.commit()
+        # Small LRU of recently used conversations: (last turn id, turn count, turns).
+        # Entries are revalidated on read since other workers may write the same database.
+        self._cache: "OrderedDict[str, Tuple[int, int, Deque[Dict[str, Any]]]]" = OrderedDict()
+        self._cache_size = cache_size
+    
+    def _cache_put(self, conversation_id: str, last_id: int, count: int, turns: Deque[Dict[str, Any]]) -> None:
+        """Insert or refresh a conversation in the LRU, evicting the oldest."""
+        self._cache[conversation_id] = (last_id, count, turns)
+        self._cache.move_to_end(conversation_id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+    
+    def create_conversation(self, title: Optional[str] = None) -> str:
+        """
+        Create a new conversation and return its ID.
+        
+        Returns:
+            Conversation ID
+        """
+        conversation_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO conversations (cid, user_id, title, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, self.user_id, title, time.time_ns())
+            )
+            self._conn.commit()
+            self._cache_put(conversation_id, 0, 0, deque(maxlen=self._max_history))
+        logger.info(f"Created new conversation: {conversation_id}")
+        return conversation_id
+    
+    def add_conversation_turn(
+        self, 
+        conversation_id: str, 
+        user_message: str, 
+        assistant_message: str,
+        query_embedding: Optional[bytes] = None
+    ) -> None:
+        """
+        Add a conversation turn to the history.
+        
+        Args:
+            conversation_id: Conversation identifier
+            user_message: User's message
+            assistant_message: Assistant's response
+            query_embedding: Raw float32 bytes of the question embedding, if computed
+        """
+        turn = {
+            'timestamp_ns': time.time_ns(),
+            'user': user_message,
+            'assistant': assistant_message
+        }
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO conversations (cid, user_id, title, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, self.user_id, None, turn['timestamp_ns'])
+            )
+            cursor = self._conn.execute(
+                "INSERT INTO turns (cid, ts, user, assistant, query_embedding) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, turn['timestamp_ns'], user_message, assistant_message, query_embedding)
+            )
+            self._conn.commit()
+            cached = self._cache.get(conversation_id)
+            if cached is not None:
+                # A turn written meanwhile by another worker shows up as a count
+                # mismatch on the next read, which then reloads from the database
+                _, count, turns = cached
+                turns.append(turn)
+                self._cache_put(conversation_id, cursor.lastrowid, count + 1, turns)
+        logger.debug(f"Added turn to conversation {conversation_id}")
+    
+    def get_conversation_history(
+        self, 
+        conversation_id: str, 
+        max_turns: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Get conversation history for a given conversation ID.
+        
+        Args:
+            conversation_id: Conversation identifier
+            max_turns: Maximum number of turns to return
+            
+        Returns:
+            List of conversation turns
+        """
+        with self._lock:
+            last_id, count = self._conn.execute(
+                "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM turns WHERE cid = ?",
+                (conversation_id,)
+            ).fetchone()
+            cached = self._cache.get(conversation_id)
+            if cached is not None and cached[:2] == (last_id, count):
+                history = cached[2]
+            else:
+                if not count:
+                    self._cache.pop(conversation_id, None)
+                    return []
+                rows = self._conn.execute(
+                    "SELECT ts, user, assistant FROM turns WHERE cid = ? AND id <= ? ORDER BY id",
+                    (conversation_id, last_id)
+                ).fetchall()
+                history = deque(
+                    ({'timestamp_ns': ts, 'user': user, 'assistant': assistant} for ts, user, assistant in rows),
+                    maxlen=self._max_history
+                )
+            self._cache_put(conversation_id, last_id, count, history)
+            
+            if max_turns:
+                return list(islice(history, max(0, len(history) - max_turns), None))
+            return list(history)
+    
+    def get_turn_embeddings(self, conversation_id: str) -> List[Optional[bytes]]:
+        """
+        Get the stored question embeddings for a conversation, one per turn.
+        
+        Args:
+            conversation_id: Conversation identifier
+            
+        Returns:
+            List of float32 embedding bytes (None where no embedding was recorded)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query_embedding FROM turns WHERE cid = ? ORDER BY id",
+                (conversation_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+    
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """
+        Delete a conversation from the store.
+        
+        Args:
+            conversation_id: Conversation identifier
+            
+        Returns:
+            True if deleted successfully, False if not found
+        """
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM conversations WHERE cid = ?", (conversation_id,)
+            ).rowcount
+            deleted += self._conn.execute(
+                "DELETE FROM turns WHERE cid = ?", (conversation_id,)
+            ).rowcount
+            self._conn.commit()
+            self._cache.pop(conversation_id, None)
+        if deleted:
+            logger.info(f"Deleted conversation {conversation_id}")
+            return True
+        return False
+    
+    def list_conversations(self) -> List[Dict[str, Any]]:
+        """
+        List all conversations with metadata.
+        
+        Returns:
+            List of conversation metadata
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT t.cid, MIN(t.ts), MAX(t.ts), COUNT(*),
+                       (SELECT f.user FROM turns f WHERE f.cid = t.cid ORDER BY f.id LIMIT 1)
+                FROM turns t JOIN conversations c ON c.cid = t.cid
+                WHERE c.user_id IS ?
+                GROUP BY t.cid
+                """,
+                (self.user_id,)
+            ).fetchall()
+        
+        return [
+            {
+                'conversation_id': conv_id,
+                'title': 'Local Chat',
+                'created_at': format_timestamp(created_at),
+                'last_updated': format_timestamp(last_updated),
+                'message_count': message_count,
+                'preview': first_user[:100] + "..." if len(first_user) > 100 else first_user
+            }
+            for conv_id, created_at, last_updated, message_count, first_user in rows
+        ]
+    
+    def clear_all_conversations(self) -> None:
+        """Clear all of this user's conversations from the store."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM turns WHERE cid IN (SELECT cid FROM conversations WHERE user_id IS ?)",
+                (self.user_id,)
+            )
+            self._conn.execute("DELETE FROM conversations WHERE user_id IS ?", (self.user_id,))
+            self._conn.commit()
+            self._cache.clear()
         logger.info("Cleared all conversations")
@@ -1,20 +1,58 @@
+import functools
+import hashlib
 import re
-from typing import List, Dict, Any
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import List, Dict, Any, Iterable, Iterator
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TokenTextSplitter
 from config.settings import settings
 from src.logging_utils import get_logger
 
 logger = get_logger(__name__)
 
+_WS_RE = re.compile(r'\s+')
+_PUNCT_RE = re.compile(r'[^\w\s\.,!?;:\-\'"()]')
+_CLEAN_CACHE_MAX_CHARS = 1_000_000
+PREVIEW_CHARS = 200
+
+def make_preview(content: str) -> str:
+    """Build the short source preview shown alongside answers."""
+    return content[:PREVIEW_CHARS] + "..." if len(content) > PREVIEW_CHARS else content
+
+def _clean_text(text: str) -> str:
+    """Collapse whitespace and strip unsupported special characters."""
+    # Two C-level passes: a fused alternation would need a Python callback per
+    # match. Note this order leaves two spaces where a symbol sat between spaces
+    # ("a @ b" -> "a  b"); chunk hashes and cached embeddings depend on it.
+    # Remove excessive whitespace
+    text = _WS_RE.sub(' ', text)
+    
+    # Remove special characters but keep punctuation
+    text = _PUNCT_RE.sub('', text)
+    
+    # Strip and return
+    return text.strip()
+
+@functools.lru_cache(maxsize=4096)
+def _clean_text_cached(text: str) -> str:
+    """Memoized _clean_text for repeated inputs such as shared headers and footers."""
+    return _clean_text(text)
+
 class TextPreprocessor:
     """Handles text cleaning and chunking operations."""
     
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        if settings.text_splitter == "token":
+            # tiktoken-backed splitting; chunk_size/chunk_overlap count BPE tokens
+            self.text_splitter = TokenTextSplitter(
+                encoding_name="cl100k_base",
+                chunk_size=settings.chunk_size,
+                chunk_overlap=settings.chunk_overlap
+            )
+        else:
+            self.text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=settings.chunk_size,
+                chunk_overlap=settings.chunk_overlap,
+                separators=["\n\n", "\n", " ", ""]
+            )
     
     def clean_text(self, text: str) -> str:
         """
@@ -26,14 +64,22 @@ class TextPreprocessor:
         Returns:
             Cleaned text
         """
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s\.,!?;:\-\'"()]', '', text)
-        
-        # Strip and return
-        return text.strip()
+        # Large inputs bypass the cache to keep its memory bounded
+        if len(text) > _CLEAN_CACHE_MAX_CHARS:
+            return _clean_text(text)
+        return _clean_text_cached(text)
+    
+    def _make_chunk(self, name: str, path: str, index: int, content: str) -> Dict[str, Any]:
+        """Build a chunk dictionary."""
+        return {
+            'chunk_id': f"{name}_chunk_{index}",
+            'source_document': name,
+            'source_path': path,
+            'chunk_index': index,
+            'content': content,
+            'preview': make_preview(content),
+            'content_hash': hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+        }
     
     def chunk_document(self, document: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -46,24 +92,16 @@ class TextPreprocessor:
             List of chunk dictionaries
         """
         try:
-            # Clean the text
-            cleaned_text = self.clean_text(document['content'])
-            
-            # Split into chunks
-            chunks = self.text_splitter.split_text(cleaned_text)
+            # Split the raw text, then clean each chunk. This avoids a full
+            # cleaned copy of the document and lets the splitter see the
+            # paragraph and line breaks that cleaning would collapse.
+            chunks = [self.clean_text(chunk) for chunk in self.text_splitter.split_text(document['content'])]
+            chunks = [chunk for chunk in chunks if chunk]
             
             # Create chunk documents
-            chunk_documents = []
-            for i, chunk in enumerate(chunks):
-                chunk_doc = {
-                    'chunk_id': f"{document['file_name']}_chunk_{i}",
-                    'source_document': document['file_name'],
-                    'source_path': document['file_path'],
-                    'chunk_index': i,
-                    'content': chunk,
-                    'chunk_size': len(chunk)
-                }
-                chunk_documents.append(chunk_doc)
+            name = document['file_name']
+            path = document['file_path']
+            chunk_documents = [self._make_chunk(name, path, i, chunk) for i, chunk in enumerate(chunks)]
             
             logger.info(f"Split document {document['file_name']} into {len(chunk_documents)} chunks")
             return chunk_documents
@@ -72,6 +110,52 @@ class TextPreprocessor:
             logger.error(f"Error chunking document {document['file_name']}: {str(e)}")
             return []
     
+    def chunk_stream(self, blocks: Iterable[str], document: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Split a stream of text blocks into chunks as the blocks arrive.
+        
+        Only a window of a few chunks is buffered, so memory stays bounded by
+        the chunk size rather than the document size.
+        
+        Args:
+            blocks: Iterable of raw text blocks
+            document: Document metadata with 'file_name' and 'file_path'
+            
+        Yields:
+            Chunk dictionaries
+        """
+        name = document['file_name']
+        path = document['file_path']
+        window = 4 * (settings.chunk_size + settings.chunk_overlap)
+        buffer = ""
+        index = 0
+        
+        for block in blocks:
+            buffer += block
+            if len(buffer) < window:
+                continue
+            pieces = self.text_splitter.split_text(buffer)
+            if len(pieces) < 2:
+                continue
+            # Emit all but the last piece; it is re-split together with the next block
+            for piece in pieces[:-1]:
+                content = self.clean_text(piece)
+                if content:
+                    yield self._make_chunk(name, path, index, content)
+                    index += 1
+            # Carry over the raw tail rather than the stripped piece, so trailing
+            # whitespace still separates it from the next block
+            start = buffer.rfind(pieces[-1])
+            buffer = buffer[start:] if start >= 0 else pieces[-1]
+        
+        for piece in self.text_splitter.split_text(buffer):
+            content = self.clean_text(piece)
+            if content:
+                yield self._make_chunk(name, path, index, content)
+                index += 1
+        
+        logger.info(f"Split document {name} into {index} chunks")
+    
     def process_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Process multiple documents into chunks.
@@ -1,14 +1,23 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple, BinaryIO, Iterator
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
 from src.ingest import DocumentIngester
-from src.preprocess import TextPreprocessor
+from src.preprocess import TextPreprocessor, make_preview
 from src.embeddings import EmbeddingManager
 from src.llm import LLMWrapper
-from src.memory import ConversationMemory
+from src.memory import ConversationMemory, SQLiteConversationMemory
+from src.response_cache import SemanticResponseCache
+from config.settings import settings
 from src.logging_utils import get_logger
 from src.error_handling import ChatbotError
 
 logger = get_logger(__name__)
 
+# Chunks embedded and stored per add_documents call during streaming ingestion
+INGEST_BATCH_SIZE = 64
+
 class RAGPipeline:
     """Main RAG pipeline that orchestrates the entire process."""
     
@@ -17,7 +26,98 @@ class RAGPipeline:
         self.preprocessor = TextPreprocessor()
         self.embedding_manager = EmbeddingManager()
         self.llm = LLMWrapper()
-        self.memory = ConversationMemory(user_id)
+        if settings.conversation_store == "sqlite":
+            self.memory = SQLiteConversationMemory(user_id)
+        else:
+            self.memory = ConversationMemory(user_id)
+        self.response_cache = SemanticResponseCache(
+            capacity=settings.semantic_cache_size,
+            ttl_seconds=settings.semantic_cache_ttl
+        )
+    
+    def _ingest_file_streaming(self, file_path: str) -> int:
+        """
+        Stream one file through chunking and embedding in mini-batches.
+        
+        Args:
+            file_path: Path to the document file
+            
+        Returns:
+            Number of chunks produced
+        """
+        path = Path(file_path)
+        return self._ingest_blocks(self.ingester.stream_document(file_path), path.name, str(path))
+    
+    def _ingest_upload_streaming(self, file_name: str, file_obj: BinaryIO) -> int:
+        """Stream one uploaded file through chunking and embedding in mini-batches."""
+        return self._ingest_blocks(self.ingester.stream_upload(file_name, file_obj), file_name, file_name)
+    
+    def _ingest_blocks(self, blocks: Iterator[str], file_name: str, source_path: str) -> int:
+        """
+        Chunk a stream of text blocks and store it in batches of INGEST_BATCH_SIZE chunks.
+        
+        Args:
+            blocks: Text blocks of one document
+            file_name: File name recorded in chunk metadata
+            source_path: Source path recorded in chunk metadata
+            
+        Returns:
+            Number of chunks produced
+        """
+        chunks = self.preprocessor.chunk_stream(blocks, {'file_name': file_name, 'file_path': source_path})
+        
+        batch = []
+        total = 0
+        produced_ids = set()
+        try:
+            for chunk in chunks:
+                produced_ids.add(chunk['chunk_id'])
+                batch.append(chunk)
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    self.embedding_manager.add_documents(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                self.embedding_manager.add_documents(batch)
+                total += len(batch)
+        except Exception:
+            # Earlier batches are already committed and stay searchable
+            if total:
+                logger.warning(f"Ingestion of {file_name} failed after storing {total} chunks; they remain in the knowledge base")
+            raise
+        
+        # Chunks of an earlier, longer version of this file would otherwise stay searchable
+        self.embedding_manager.delete_stale_chunks(source_path, produced_ids)
+        return total
+    
+    def _delete_stale_chunks(self, documents: List[Dict[str, Any]], chunks: List[Dict[str, Any]]) -> None:
+        """Drop stored chunks of the given documents that their new chunking did not produce."""
+        produced_ids: Dict[str, Set[str]] = {}
+        for chunk in chunks:
+            produced_ids.setdefault(chunk['source_path'], set()).add(chunk['chunk_id'])
+        for document in documents:
+            self.embedding_manager.delete_stale_chunks(
+                document['file_path'], produced_ids.get(document['file_path'], set())
+            )
+    
+    def _check_ingest_results(self, file_paths: List[str], results: List[Any]) -> int:
+        """
+        Log per-file ingestion failures and raise if any file failed.
+        
+        Args:
+            file_paths: Files that were ingested
+            results: Chunk count or exception for each file, in the same order
+            
+        Returns:
+            Total number of chunks stored
+        """
+        failures = [(path, result) for path, result in zip(file_paths, results) if isinstance(result, BaseException)]
+        for path, error in failures:
+            logger.error(f"Failed to ingest {path}: {str(error)}")
+        if failures:
+            names = ", ".join(Path(path).name for path, _ in failures)
+            raise ChatbotError(f"{len(failures)} of {len(file_paths)} files failed to ingest ({names}): {str(failures[0][1])}")
+        return sum(results)
     
     def ingest_documents(self, file_paths: List[str]) -> None:
         """
@@ -29,23 +129,76 @@ class RAGPipeline:
         try:
             logger.info(f"Starting document ingestion for {len(file_paths)} files")
             
-            # Step 1: Ingest documents
-            documents = []
-            for file_path in file_paths:
-                doc = self.ingester.ingest_document(file_path)
-                documents.append(doc)
+            # Stream each file through extract -> chunk -> embed; files run concurrently
+            with ThreadPoolExecutor(max_workers=max(1, min(8, len(file_paths)))) as executor:
+                futures = [executor.submit(self._ingest_file_streaming, file_path) for file_path in file_paths]
+            # Every worker has finished here, so failures are collected rather than raised early
+            results = [future.exception() or future.result() for future in futures]
+            total_chunks = self._check_ingest_results(file_paths, results)
             
-            # Step 2: Preprocess and chunk
-            chunks = self.preprocessor.process_documents(documents)
+            logger.info(f"Successfully ingested {len(file_paths)} documents into {total_chunks} chunks")
             
-            # Step 3: Create embeddings and store
-            self.embedding_manager.add_documents(chunks)
+        except Exception as e:
+            logger.error(f"Error in document ingestion pipeline: {str(e)}")
+            raise ChatbotError(f"Document ingestion failed: {str(e)}")
+        finally:
+            # Partial batches may have been stored even when a file failed
+            self.embedding_manager.persist_index()
+            self.response_cache.clear()
+    
+    async def aingest_documents(self, file_paths: List[str]) -> None:
+        """
+        Async variant of ingest_documents that streams files concurrently in worker threads.
+        
+        Args:
+            file_paths: List of document file paths to ingest
+        """
+        try:
+            logger.info(f"Starting document ingestion for {len(file_paths)} files")
+            
+            # Wait for every worker before reporting so none keeps writing after we return
+            results = await asyncio.gather(
+                *(asyncio.to_thread(self._ingest_file_streaming, file_path) for file_path in file_paths),
+                return_exceptions=True
+            )
+            total_chunks = self._check_ingest_results(file_paths, results)
             
-            logger.info(f"Successfully ingested {len(documents)} documents into {len(chunks)} chunks")
+            logger.info(f"Successfully ingested {len(file_paths)} documents into {total_chunks} chunks")
             
         except Exception as e:
             logger.error(f"Error in document ingestion pipeline: {str(e)}")
             raise ChatbotError(f"Document ingestion failed: {str(e)}")
+        finally:
+            # Partial batches may have been stored even when a file failed
+            self.embedding_manager.persist_index()
+            self.response_cache.clear()
+    
+    def ingest_streams(self, streams: List[Tuple[str, BinaryIO]]) -> None:
+        """
+        Ingest and process documents directly from open binary streams.
+        
+        Args:
+            streams: List of (file name, binary file object) pairs
+        """
+        try:
+            logger.info(f"Starting stream ingestion for {len(streams)} files")
+            
+            # Same extract -> chunk -> embed streaming as ingest_documents, one thread per upload
+            names = [name for name, _ in streams]
+            with ThreadPoolExecutor(max_workers=max(1, min(8, len(streams)))) as executor:
+                futures = [executor.submit(self._ingest_upload_streaming, name, file_obj) for name, file_obj in streams]
+            results = [future.exception() or future.result() for future in futures]
+            total_chunks = self._check_ingest_results(names, results)
+            
+            logger.info(f"Successfully ingested {len(streams)} documents into {total_chunks} chunks")
+            
+        except Exception as e:
+            logger.error(f"Error in stream ingestion pipeline: {str(e)}")
+            raise ChatbotError(f"Document ingestion failed: {str(e)}")
+        finally:
+            # Partial batches may have been stored even when a file failed
+            self.embedding_manager.persist_index()
+            self.response_cache.clear()
     
     def ingest_directory(self, directory_path: str) -> None:
         """
@@ -65,12 +218,102 @@ class RAGPipeline:
             
             # Step 3: Create embeddings and store
             self.embedding_manager.add_documents(chunks)
+            self._delete_stale_chunks(documents, chunks)
             
             logger.info(f"Successfully ingested directory with {len(documents)} documents")
             
         except Exception as e:
             logger.error(f"Error in directory ingestion: {str(e)}")
             raise ChatbotError(f"Directory ingestion failed: {str(e)}")
+        finally:
+            self.embedding_manager.persist_index()
+            self.response_cache.clear()
+    
+    def _get_history(self, conversation_id: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """Load the conversation history, if the question belongs to a conversation."""
+        if not conversation_id:
+            return None
+        return self.memory.get_conversation_history(conversation_id)
+    
+    def _embed_question(self, question: str) -> Optional[np.ndarray]:
+        """Embed the question once for the cache probe and retrieval; None if embedding fails."""
+        try:
+            return self.embedding_manager.embed_query(question)
+        except Exception as e:
+            logger.warning(f"Could not embed question: {str(e)}")
+            return None
+    
+    async def _aembed_question(self, question: str) -> Optional[np.ndarray]:
+        """Async variant of _embed_question."""
+        try:
+            return await self.embedding_manager.aembed_query(question)
+        except Exception as e:
+            logger.warning(f"Could not embed question: {str(e)}")
+            return None
+    
+    def _probe_cache(
+        self,
+        query_embedding: Optional[np.ndarray],
+        conversation_history: Optional[List[Dict[str, Any]]],
+        top_k: int
+    ) -> Tuple[bool, int, Optional[Dict[str, Any]]]:
+        """
+        Look the question up in the semantic response cache.
+        
+        Returns:
+            Whether the answer may be cached, the cache generation to store it
+            under, and the cached entry on a hit
+        """
+        # Answers depend on history, so only standalone questions use the cache
+        use_cache = query_embedding is not None and not conversation_history
+        generation = self.response_cache.generation
+        cached = None
+        if use_cache:
+            cached = self.response_cache.get(
+                query_embedding, threshold=settings.semantic_cache_threshold, top_k=top_k
+            )
+        return use_cache, generation, cached
+    
+    def _retrieve(self, query_embedding: Optional[np.ndarray], top_k: int) -> List[Dict[str, Any]]:
+        """Retrieve relevant documents, returning none when the knowledge base is empty."""
+        if query_embedding is None:
+            return []
+        try:
+            relevant_docs = self.embedding_manager.search_by_vector(query_embedding, top_k)
+            logger.info(f"Found {len(relevant_docs)} relevant documents")
+            return relevant_docs
+        except Exception as e:
+            logger.warning(f"No documents in knowledge base, using general chat mode: {str(e)}")
+            return []
+    
+    async def _aretrieve(self, query_embedding: Optional[np.ndarray], top_k: int) -> List[Dict[str, Any]]:
+        """Async variant of _retrieve."""
+        if query_embedding is None:
+            return []
+        try:
+            relevant_docs = await self.embedding_manager.asearch_by_vector(query_embedding, top_k)
+            logger.info(f"Found {len(relevant_docs)} relevant documents")
+            return relevant_docs
+        except Exception as e:
+            logger.warning(f"No documents in knowledge base, using general chat mode: {str(e)}")
+            return []
+    
+    def _store_turn(
+        self,
+        conversation_id: Optional[str],
+        question: str,
+        answer: str,
+        query_embedding: Optional[np.ndarray]
+    ) -> None:
+        """Record the turn in conversation memory."""
+        if not conversation_id:
+            return
+        self.memory.add_conversation_turn(
+            conversation_id=conversation_id,
+            user_message=question,
+            assistant_message=answer,
+            query_embedding=query_embedding.tobytes() if query_embedding is not None else None
+        )
     
     def ask_question(
         self, 
@@ -92,56 +335,99 @@ class RAGPipeline:
         try:
             logger.info(f"Processing question: {question[:100]}...")
             
-            # Step 1: Try to retrieve relevant documents (if any exist)
-            relevant_docs = []
-            try:
-                relevant_docs = self.embedding_manager.search_similar(question, top_k)
-                logger.info(f"Found {len(relevant_docs)} relevant documents")
-            except Exception as e:
-                logger.warning(f"No documents in knowledge base, using general chat mode: {str(e)}")
-            
-            # Step 2: Get conversation history if available
-            conversation_history = None
-            if conversation_id:
-                conversation_history = self.memory.get_conversation_history(conversation_id)
-            
-            # Step 3: Generate response using LLM (with or without documents)
-            if relevant_docs:
-                # RAG mode - use documents as context
-                answer = self.llm.generate_response(
-                    query=question,
-                    context_documents=relevant_docs,
-                    conversation_history=conversation_history
-                )
+            conversation_history = self._get_history(conversation_id)
+            query_embedding = self._embed_question(question)
+            use_cache, generation, cached = self._probe_cache(query_embedding, conversation_history, top_k)
+            
+            if cached is not None:
+                answer = cached['answer']
+                relevant_docs = cached['sources']
+            else:
+                relevant_docs = self._retrieve(query_embedding, top_k)
+                
+                if relevant_docs:
+                    # RAG mode - use documents as context
+                    answer = self.llm.generate_response(
+                        query=question,
+                        context_documents=relevant_docs,
+                        conversation_history=conversation_history
+                    )
+                else:
+                    # General chat mode - no documents
+                    logger.info("Using general chat mode (no documents)")
+                    answer = self.llm.generate_general_response(
+                        query=question,
+                        conversation_history=conversation_history
+                    )
+                
+                if use_cache:
+                    self.response_cache.put(query_embedding, answer, relevant_docs, top_k, generation)
+            
+            self._store_turn(conversation_id, question, answer, query_embedding)
+            
+            response = self._format_response(answer, relevant_docs, conversation_id)
+            logger.info("Successfully generated response")
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error in question answering: {str(e)}")
+            raise ChatbotError(f"Question answering failed: {str(e)}")
+    
+    async def aask_question(
+        self, 
+        question: str, 
+        conversation_id: Optional[str] = None,
+        top_k: int = 5
+    ) -> Dict[str, Any]:
+        """
+        Async variant of ask_question; blocking steps run in worker threads.
+        
+        Args:
+            question: User's question
+            conversation_id: Optional conversation ID for context
+            top_k: Number of relevant documents to retrieve
+            
+        Returns:
+            Dictionary containing answer and metadata
+        """
+        try:
+            logger.info(f"Processing question: {question[:100]}...")
+            
+            conversation_history = await asyncio.to_thread(self._get_history, conversation_id)
+            query_embedding = await self._aembed_question(question)
+            use_cache, generation, cached = self._probe_cache(query_embedding, conversation_history, top_k)
+            
+            if cached is not None:
+                answer = cached['answer']
+                relevant_docs = cached['sources']
             else:
-                # General chat mode - no documents
-                logger.info("Using general chat mode (no documents)")
-                answer = self.llm.generate_general_response(
-                    query=question,
-                    conversation_history=conversation_history
-                )
-            
-            # Step 4: Store conversation turn
-            if conversation_id:
-                self.memory.add_conversation_turn(
-                    conversation_id=conversation_id,
-                    user_message=question,
-                    assistant_message=answer
-                )
-            
-            # Step 5: Prepare response
-            response = {
-                'answer': answer,
-                'sources': [
-                    {
-                        'source': doc['metadata'].get('source_document', 'Unknown'),
-                        'content_preview': doc['content'][:200] + "..." if len(doc['content']) > 200 else doc['content']
-                    }
-                    for doc in relevant_docs
-                ],
-                'conversation_id': conversation_id
-            }
+                # Warm the RAG prompt prefix while retrieval runs; without an
+                # embedding there is no retrieval and the general prompt is used
+                if query_embedding is not None:
+                    self.llm.schedule_prewarm()
+                relevant_docs = await self._aretrieve(query_embedding, top_k)
+                
+                if relevant_docs:
+                    # RAG mode - use documents as context
+                    answer = await self.llm.agenerate_response(
+                        query=question,
+                        context_documents=relevant_docs,
+                        conversation_history=conversation_history
+                    )
+                else:
+                    # General chat mode - no documents
+                    logger.info("Using general chat mode (no documents)")
+                    answer = await self.llm.agenerate_general_response(
+                        query=question,
+                        conversation_history=conversation_history
+                    )
+                
+                if use_cache:
+                    self.response_cache.put(query_embedding, answer, relevant_docs, top_k, generation)
+            
+            await asyncio.to_thread(self._store_turn, conversation_id, question, answer, query_embedding)
             
+            response = self._format_response(answer, relevant_docs, conversation_id)
             logger.info("Successfully generated response")
             return response
             
@@ -149,10 +435,31 @@ class RAGPipeline:
             logger.error(f"Error in question answering: {str(e)}")
             raise ChatbotError(f"Question answering failed: {str(e)}")
     
+    def _format_response(
+        self, 
+        answer: str, 
+        relevant_docs: List[Dict[str, Any]], 
+        conversation_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """Build the answer payload returned to API clients."""
+        return {
+            'answer': answer,
+            'sources': [
+                {
+                    'source': doc['metadata'].get('source_document', 'Unknown'),
+                    # Chunks ingested before previews were stored fall back to building one
+                    'content_preview': doc['metadata'].get('preview') or make_preview(doc['content'])
+                }
+                for doc in relevant_docs
+            ],
+            'conversation_id': conversation_id
+        }
+    
     def clear_knowledge_base(self) -> None:
         """Clear all documents from the knowledge base."""
         try:
             self.embedding_manager.clear_collection()
+            self.response_cache.clear()
             logger.info("Cleared knowledge base")
         except Exception as e:
             logger.error(f"Error clearing knowledge base: {str(e)}")
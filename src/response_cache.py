@@ -0,0 +1,112 @@
+from typing import List, Dict, Any, Optional
+import threading
+import time
+import numpy as np
+from src.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+class SemanticResponseCache:
+    """Caches generated answers keyed by normalized query embeddings, with LRU + TTL eviction."""
+    
+    def __init__(self, capacity: int = 256, ttl_seconds: float = 3600.0):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._keys: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._valid = np.zeros(capacity, dtype=bool)
+        # Bumped on every clear; answers generated against an older generation are not stored
+        self.generation = 0
+        self._lock = threading.Lock()
+    
+    def _live_mask(self, now: float) -> np.ndarray:
+        """Slots that hold an entry younger than the TTL."""
+        created = np.array([entry['timestamp'] if entry else 0.0 for entry in self._entries])
+        return self._valid & (now - created <= self.ttl_seconds)
+    
+    def get(self, query_vec: np.ndarray, threshold: float, top_k: int) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached answer for a semantically similar query.
+        
+        Args:
+            query_vec: L2-normalized query embedding
+            threshold: Minimum cosine similarity for a hit
+            top_k: Number of sources the answer must have been built from
+        
+        Returns:
+            Cached entry with 'answer' and 'sources', or None on a miss
+        """
+        if self.capacity <= 0:
+            return None
+        with self._lock:
+            if self._keys is None:
+                return None
+            now = time.time()
+            live = self._live_mask(now)
+            if not live.any():
+                return None
+            # Answers built from a different number of sources do not match
+            live &= np.array([entry is not None and entry['top_k'] == top_k for entry in self._entries])
+            if not live.any():
+                return None
+            sims = self._keys @ query_vec
+            sims[~live] = -np.inf
+            best = int(np.argmax(sims))
+            if sims[best] < threshold:
+                return None
+            entry = self._entries[best]
+            entry['hit_count'] += 1
+            self._last_used[best] = now
+            logger.info(f"Semantic response cache hit (similarity {float(sims[best]):.3f})")
+            return entry
+    
+    def put(
+        self,
+        query_vec: np.ndarray,
+        answer: str,
+        sources: List[Dict[str, Any]],
+        top_k: int,
+        generation: int
+    ) -> None:
+        """
+        Store an answer for a query, evicting an expired or least recently used entry when full.
+        
+        Args:
+            query_vec: L2-normalized query embedding
+            answer: Generated answer
+            sources: Retrieved documents used for the answer
+            top_k: Number of sources requested for the answer
+            generation: Value of self.generation read before retrieval started
+        """
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            # The knowledge base changed while this answer was generated
+            if generation != self.generation:
+                return
+            if self._keys is None:
+                self._keys = np.zeros((self.capacity, query_vec.shape[0]), dtype=np.float32)
+            now = time.time()
+            live = self._live_mask(now)
+            # Prefer an empty or expired slot, otherwise evict the least recently used
+            free = np.flatnonzero(~live)
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+            self._keys[slot] = query_vec
+            self._entries[slot] = {
+                'answer': answer,
+                'sources': sources,
+                'top_k': top_k,
+                'timestamp': now,
+                'hit_count': 0
+            }
+            self._last_used[slot] = now
+            self._valid[slot] = True
+    
+    def clear(self) -> None:
+        """Drop all cached answers."""
+        with self._lock:
+            self._entries = [None] * self.capacity
+            self._last_used[:] = 0.0
+            self._valid[:] = False
+            self.generation += 1
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Make the project packages (src, config) importable when running pytest from any directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
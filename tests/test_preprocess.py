@@ -0,0 +1,64 @@
+import pytest
+from config.settings import settings
+from src.preprocess import TextPreprocessor
+
+CHUNK_SIZE = 100
+CHUNK_OVERLAP = 20
+
+@pytest.fixture
+def preprocessor(monkeypatch):
+    monkeypatch.setattr(settings, "chunk_size", CHUNK_SIZE)
+    monkeypatch.setattr(settings, "chunk_overlap", CHUNK_OVERLAP)
+    monkeypatch.setattr(settings, "text_splitter", "character")
+    return TextPreprocessor()
+
+def _blocks(text: str, size: int):
+    """Cut text into fixed-size blocks that ignore word boundaries."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def test_chunk_stream_covers_text_across_block_boundaries(preprocessor):
+    words = [f"w{i:04d}" for i in range(3000)]
+    text = " ".join(words)
+    document = {'file_name': 'doc.txt', 'file_path': '/tmp/doc.txt'}
+    
+    # 37-character blocks split words, and the buffer window is re-split many times
+    chunks = list(preprocessor.chunk_stream(_blocks(text, 37), document))
+    
+    assert [chunk['chunk_index'] for chunk in chunks] == list(range(len(chunks)))
+    assert all(0 < len(chunk['content']) <= CHUNK_SIZE for chunk in chunks)
+    
+    # No word may be cut in half at a block boundary
+    chunk_words = [chunk['content'].split() for chunk in chunks]
+    known = set(words)
+    assert all(word in known for piece in chunk_words for word in piece)
+    
+    # Reading the chunks in order, dropping repeated words, gives back the document
+    seen = []
+    for piece in chunk_words:
+        seen.extend(word for word in piece if not seen or word > seen[-1])
+    assert seen == words
+
+def test_chunk_stream_overlaps_consecutive_chunks(preprocessor):
+    text = " ".join(f"w{i:04d}" for i in range(3000))
+    document = {'file_name': 'doc.txt', 'file_path': '/tmp/doc.txt'}
+    
+    chunks = list(preprocessor.chunk_stream(_blocks(text, 37), document))
+    
+    assert len(chunks) > 2
+    for previous, current in zip(chunks, chunks[1:]):
+        previous_words = previous['content'].split()
+        current_words = current['content'].split()
+        # The next chunk starts inside the overlap window at the end of the previous one
+        assert current_words[0] in previous_words
+        overlap = previous_words[previous_words.index(current_words[0]):]
+        assert current_words[:len(overlap)] == overlap
+        assert len(" ".join(overlap)) <= CHUNK_OVERLAP
+
+def test_chunk_stream_matches_whole_document_for_short_text(preprocessor):
+    text = "First paragraph of text.\n\nSecond paragraph, a little longer than the first one."
+    document = {'file_name': 'short.txt', 'file_path': '/tmp/short.txt', 'content': text}
+    
+    streamed = [chunk['content'] for chunk in preprocessor.chunk_stream(_blocks(text, 10), document)]
+    whole = [chunk['content'] for chunk in preprocessor.chunk_document(document)]
+    
+    assert streamed == whole